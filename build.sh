@@ -1 +1 @@
-pyinstaller --add-data "assets:assets" --icon=assets/icon.png --onefile src/main.py
\ No newline at end of file
+pip install -r requirements.txt && python src/asset_bundle.py && pyinstaller --add-data "assets/assets.bundle:assets" --add-data "assets/audio:assets/audio" --add-data "assets/font:assets/font" --add-data "assets/tutorial.txt:assets" --icon=assets/icon.png --onefile src/main.py
\ No newline at end of file
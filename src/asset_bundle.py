@@ -0,0 +1,177 @@
+import hashlib
+import json
+import mmap
+import os
+import struct
+import pygame
+from pygame import Surface
+
+
+BUNDLE_MAGIC = b'MASTBNDL'
+BUNDLE_VERSION = 2
+# Magic, version and index length
+HEADER_FORMAT = '<8sII'
+PIXEL_FORMAT = 'RGBA'
+DATA_ALIGNMENT = 16
+
+# Frame entries in the index are [offset, width, height], offsets relative to the start of the pixel data
+FrameEntry = list[int]
+# Source entries are [file size, modification time in ns, sha1 of the file] and, for spritesheets, the sprite size
+SourceEntry = list
+
+
+def align(value: int, alignment: int=DATA_ALIGNMENT) -> int:
+    return (value + alignment - 1) // alignment * alignment
+
+
+def get_file_hash(path: str) -> str:
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def get_source_entry(path: str) -> SourceEntry:
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns, get_file_hash(path)]
+
+
+# A compiled asset bundle: a header, a JSON index, then the raw pixels of every image and spritesheet
+# frame, already sliced. The file is memory-mapped, so surfaces are built straight from its pages.
+class AssetBundle:
+    def __init__(self, bundle_path: str):
+        self.path = bundle_path
+        with open(bundle_path, 'rb') as f:
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, index_length = struct.unpack_from(HEADER_FORMAT, self.buffer)
+        if magic != BUNDLE_MAGIC or version != BUNDLE_VERSION:
+            raise ValueError(f'{bundle_path} is not a version {BUNDLE_VERSION} asset bundle')
+        index_start = struct.calcsize(HEADER_FORMAT)
+        index = json.loads(self.buffer[index_start:index_start + index_length].decode('utf-8'))
+        self.images: dict[str, FrameEntry] = index['images']
+        self.spritesheets: dict[str, list[FrameEntry]] = index['spritesheets']
+        # The PNG each asset was compiled from, by kind and then id
+        self.sources: dict[str, dict[str, SourceEntry]] = index['sources']
+        self.data_start = align(index_start + index_length)
+
+
+    # Whether an asset still matches the file it was compiled from. The size and modification time are
+    # checked first, so the file is only hashed when it was touched. Builds ship without the PNGs, and
+    # then there is nothing to compare against.
+    def is_current(self, kind: str, asset_id: str, source_path: str, sprite_size: list[int] | None=None) -> bool:
+        if not os.path.exists(source_path):
+            return True
+        size, mtime_ns, file_hash, *compiled_sprite_size = self.sources[kind][asset_id]
+        if sprite_size is not None and [list(sprite_size)] != compiled_sprite_size:
+            return False
+        stat = os.stat(source_path)
+        if stat.st_size != size:
+            return False
+        return stat.st_mtime_ns == mtime_ns or get_file_hash(source_path) == file_hash
+
+
+    def get_frame_bytes(self, entry: FrameEntry) -> int:
+        _, width, height = entry
+        return width * height * len(PIXEL_FORMAT)
+
+
+    # The pixels are copied once, by convert_alpha(), so the returned surface doesn't reference the mapping
+    def build_surface(self, entry: FrameEntry) -> Surface:
+        offset, width, height = entry
+        start = self.data_start + offset
+        pixels = memoryview(self.buffer)[start:start + self.get_frame_bytes(entry)]
+        surface = pygame.image.frombuffer(pixels, (width, height), PIXEL_FORMAT).convert_alpha()
+        pixels.release()
+        return surface
+
+
+    def get_image(self, image_id: str) -> Surface:
+        return self.build_surface(self.images[image_id])
+
+
+    def get_spritesheet(self, spritesheet_id: str) -> list[Surface]:
+        return [self.build_surface(entry) for entry in self.spritesheets[spritesheet_id]]
+
+
+    def close(self):
+        self.buffer.close()
+
+
+# Sources map every image id to its file, and every spritesheet id to its file and sprite size
+def write_bundle(bundle_path: str, images: dict[str, Surface], spritesheets: dict[str, list[Surface]],
+                 image_sources: dict[str, str], spritesheet_sources: dict[str, tuple[str, list[int]]]):
+    index = {'images': {}, 'spritesheets': {}, 'sources': {'image': {}, 'spritesheet': {}}}
+    chunks: list[bytes] = []
+    offset = 0
+
+    def add_frame(surface: Surface) -> FrameEntry:
+        nonlocal offset
+        pixels = pygame.image.tobytes(surface, PIXEL_FORMAT)
+        entry = [offset, surface.get_width(), surface.get_height()]
+        padding = align(len(pixels)) - len(pixels)
+        chunks.append(pixels + bytes(padding))
+        offset += len(pixels) + padding
+        return entry
+
+    for image_id, surface in images.items():
+        index['images'][image_id] = add_frame(surface)
+    for spritesheet_id, frames in spritesheets.items():
+        index['spritesheets'][spritesheet_id] = [add_frame(frame) for frame in frames]
+    for image_id, path in image_sources.items():
+        index['sources']['image'][image_id] = get_source_entry(path)
+    for spritesheet_id, (path, sprite_size) in spritesheet_sources.items():
+        index['sources']['spritesheet'][spritesheet_id] = get_source_entry(path) + [list(sprite_size)]
+
+    index_bytes = json.dumps(index, separators=(',', ':')).encode('utf-8')
+    header = struct.pack(HEADER_FORMAT, BUNDLE_MAGIC, BUNDLE_VERSION, len(index_bytes))
+    index_end = len(header) + len(index_bytes)
+    with open(bundle_path, 'wb') as f:
+        f.write(header)
+        f.write(index_bytes)
+        f.write(bytes(align(index_end) - index_end))
+        for chunk in chunks:
+            f.write(chunk)
+
+
+# Loads every image and spritesheet in the asset manifest from the source files, exactly as the game
+# would without a bundle, and writes the resulting pixels into a bundle
+def compile_bundle(bundle_path: str):
+    from globals import IMAGE_ASSETS, SPRITESHEET_ASSETS, ASSETS_PATH
+    from resource_manager import ResourceManager
+
+    image_sources = {image_id: f'{ASSETS_PATH}/{file_name}' for image_id, file_name in IMAGE_ASSETS}
+    spritesheet_sources = {spritesheet_id: (f'{ASSETS_PATH}/{file_name}', sprite_size)
+                           for spritesheet_id, file_name, sprite_size in SPRITESHEET_ASSETS}
+
+    resource_manager = ResourceManager()
+    for image_id, path in image_sources.items():
+        resource_manager.load_image(image_id, path)
+    for spritesheet_id, (path, sprite_size) in spritesheet_sources.items():
+        resource_manager.load_spritesheet(spritesheet_id, path, sprite_size)
+    resource_manager.finish_loading()
+
+    images = {image_id: resource_manager.get_image(image_id) for image_id in image_sources}
+    spritesheets = {spritesheet_id: resource_manager.get_full_spritesheet(spritesheet_id) for spritesheet_id in spritesheet_sources}
+    write_bundle(bundle_path, images, spritesheets, image_sources, spritesheet_sources)
+    return images, spritesheets
+
+
+def main_compile():
+    import argparse
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    from globals import BUNDLE_PATH
+
+    parser = argparse.ArgumentParser(description='Compile the game images and spritesheets into a pre-sliced asset bundle.')
+    parser.add_argument('--output', type=str, default=BUNDLE_PATH, help='bundle file to write')
+    args = parser.parse_args()
+
+    pygame.display.init()
+    # Conversion needs a display mode, even a hidden one
+    pygame.display.set_mode((1, 1))
+    images, spritesheets = compile_bundle(args.output)
+    frame_count = len(images) + sum(len(frames) for frames in spritesheets.values())
+    print(f'Wrote {len(images)} images and {len(spritesheets)} spritesheets ({frame_count} surfaces, '
+          f'{os.path.getsize(args.output)} bytes) to {args.output}')
+
+
+if __name__ == '__main__':
+    main_compile()
@@ -0,0 +1,95 @@
+from pygame import mixer
+from resource_manager import ResourceManager
+
+
+# Channels reserved for each group of sounds. Their sum is the cap on concurrent voices.
+# Menu sounds have their own group, so nothing played during a level can take their channels.
+VOICE_GROUPS = {
+    'weapon': 2,
+    'impact': 3,
+    'pickup': 1,
+    'event': 1,
+    'ui': 1,
+}
+MAX_VOICES = sum(VOICE_GROUPS.values())
+
+# Group and priority of every sound, with the clip length in seconds. A sound may only take over a voice
+# playing a sound of the same or lower priority, so a short sound repeated quickly replaces itself.
+# Voices at PROTECTED_PRIORITY are never taken, not even by a sound of the same priority.
+SOUNDS = {
+    'shoot': ('weapon', 1),  # 0.08
+    'hook': ('weapon', 2),  # 0.20
+    'hit': ('impact', 1),  # 0.12
+    'explosion': ('impact', 2),  # 0.22
+    'coin': ('pickup', 1),  # 0.13
+    'end_level': ('event', 2),  # 0.64
+    'death': ('event', 3),  # 0.18
+    'deltarune_explosion': ('event', 3),  # 2.07
+    'blip': ('ui', 1),  # 0.05
+    'purchase_failed': ('ui', 1),  # 0.12
+    'upgrade': ('ui', 2),  # 0.08
+}
+PROTECTED_PRIORITY = 3
+
+
+class VoiceGroup:
+    def __init__(self, channels: list[mixer.Channel]):
+        self.channels = channels
+        # Priority and start order of the last sound played on each channel
+        self.voices: list[tuple[int, int]] = [(0, 0)] * len(channels)
+
+    # A free channel, otherwise the one with the lowest priority voice, the oldest first.
+    # None if every voice has a higher priority or is protected.
+    def get_channel_index(self, priority: int) -> int | None:
+        stolen_index = None
+        for i, channel in enumerate(self.channels):
+            if not channel.get_busy():
+                return i
+            if stolen_index is None or self.voices[i] < self.voices[stolen_index]:
+                stolen_index = i
+        stolen_priority = self.voices[stolen_index][0]
+        if stolen_priority > priority or stolen_priority >= PROTECTED_PRIORITY:
+            return None
+        return stolen_index
+
+
+# Plays sounds on the reserved channels of their group, so a burst of one kind of sound can't take
+# every mixer channel. The same sound is only started once per frame.
+class VoiceManager:
+    def __init__(self, resource_manager: ResourceManager):
+        self.resource_manager = resource_manager
+        self.groups: dict[str, VoiceGroup] = {}
+        self.played_this_frame: set[str] = set()
+        self.play_count = 0
+
+    # Channels are allocated on the first play, once the mixer is initialized
+    def allocate_channels(self):
+        mixer.set_num_channels(MAX_VOICES)
+        # Sounds played directly with Sound.play() can't take the channels of a group
+        mixer.set_reserved(MAX_VOICES)
+        first_channel = 0
+        for group_id, channel_count in VOICE_GROUPS.items():
+            channels = [mixer.Channel(first_channel + i) for i in range(channel_count)]
+            self.groups[group_id] = VoiceGroup(channels)
+            first_channel += channel_count
+
+    def play(self, sound_id: str) -> bool:
+        if sound_id in self.played_this_frame:
+            return False
+        if not self.groups:
+            self.allocate_channels()
+
+        group_id, priority = SOUNDS[sound_id]
+        group = self.groups[group_id]
+        channel_index = group.get_channel_index(priority)
+        if channel_index is None:
+            return False
+
+        self.play_count += 1
+        group.channels[channel_index].play(self.resource_manager.get_sound(sound_id))
+        group.voices[channel_index] = (priority, self.play_count)
+        self.played_this_frame.add(sound_id)
+        return True
+
+    def end_frame(self):
+        self.played_this_frame.clear()
@@ -0,0 +1,332 @@
+import numpy as np
+from pygame import Vector2
+
+
+INITIAL_CAPACITY = 64
+
+# Partitions in draw order, later kinds are drawn on top
+ENTITY_KINDS = ['level_end', 'asteroid', 'orbiter', 'smart_orbiter', 'coin', 'object']
+
+# Per-entity arrays and the shape of one row
+ENTITY_FIELDS = {
+    'positions': (2,),
+    'previous_positions': (2,),
+    'velocities': (2,),
+    'radii': (),
+    'angles': (),
+    'previous_angles': (),
+    'angular_velocities': (),
+    'shake_cooldowns': (),
+    # Time an entity has not been simulated for while it was outside the activity zone
+    'pending_deltas': (),
+}
+# Extra arrays only some kinds need
+KIND_FIELDS = {
+    'orbiter': {'view_distances': ()},
+    'coin': {'magnetize_delays': ()},
+}
+
+
+def get_partition_fields(kind: str) -> dict[str, tuple]:
+    return {**ENTITY_FIELDS, **KIND_FIELDS.get(kind, {})}
+
+
+# Entities of one kind, stored as rows of contiguous arrays. Row i belongs to objects[i].
+class EntityPartition:
+    def __init__(self, kind: str, capacity: int=INITIAL_CAPACITY):
+        self.kind = kind
+        self.count = 0
+        self.objects: list = []
+        self.fields = get_partition_fields(kind)
+        for name, shape in self.fields.items():
+            setattr(self, name, np.zeros((capacity,) + shape))
+
+
+    def reserve(self, capacity: int):
+        if capacity <= len(self.radii):
+            return
+        new_capacity = max(capacity, len(self.radii) * 2)
+        for name in self.fields:
+            old = getattr(self, name)
+            new = np.zeros((new_capacity,) + old.shape[1:])
+            new[:self.count] = old[:self.count]
+            setattr(self, name, new)
+
+
+    def append(self, obj) -> int:
+        self.reserve(self.count + 1)
+        slot = self.count
+        for name in self.fields:
+            getattr(self, name)[slot] = 0
+        self.objects.append(obj)
+        self.count += 1
+        return slot
+
+
+    # Swaps the last row into the removed one so the arrays stay contiguous
+    def remove(self, slot: int):
+        last = self.count - 1
+        if slot != last:
+            for name in self.fields:
+                array = getattr(self, name)
+                array[slot] = array[last]
+            moved = self.objects[last]
+            self.objects[slot] = moved
+            moved.entity_slot = slot
+        self.objects.pop()
+        self.count -= 1
+
+
+    # Empties the partition but keeps its arrays for the next level
+    def clear(self):
+        self.objects.clear()
+        self.count = 0
+
+
+    def store_previous_states(self):
+        live = slice(0, self.count)
+        self.previous_positions[live] = self.positions[live]
+        self.previous_angles[live] = self.angles[live]
+
+
+    def get_rows(self) -> np.ndarray:
+        return np.arange(self.count)
+
+
+    # Drift, rotation and shake cooldown, same as LevelObject.update per object. delta can also be an array
+    # with one value per row.
+    def integrate(self, delta: float | np.ndarray, rows: np.ndarray | None=None):
+        if rows is None:
+            rows = slice(0, self.count)
+        row_deltas = delta[:, None] if isinstance(delta, np.ndarray) else delta
+        self.positions[rows] += self.velocities[rows] * row_deltas
+        self.angles[rows] += self.angular_velocities[rows] * delta
+        self.shake_cooldowns[rows] = np.maximum(self.shake_cooldowns[rows] - delta, 0)
+
+
+    # Simulation level of detail. Returns the rows to update this tick: the ones within active_distance of
+    # the center or flagged awake, plus every interval-th of the rest in turn. Rows that are skipped bank
+    # the delta, and a row that is due first drifts through its banked time, so waking up only depends on
+    # positions and the tick number. Only valid for kinds whose motion between updates is a plain drift.
+    def schedule(self, center: Vector2, active_distance: float, tick: int, interval: int, delta: float,
+                 awake: np.ndarray | None=None) -> np.ndarray:
+        live = slice(0, self.count)
+        offsets = self.positions[live] - (center.x, center.y)
+        due = offsets[:, 0] * offsets[:, 0] + offsets[:, 1] * offsets[:, 1] <= active_distance * active_distance
+        if awake is not None:
+            due |= awake
+        due |= (np.arange(self.count) + tick) % interval == 0
+
+        pending_deltas = self.pending_deltas[live]
+        self.catch_up(np.flatnonzero(due & (pending_deltas > 0)))
+        pending_deltas[~due] += delta
+        return np.flatnonzero(due)
+
+
+    # Drifts the rows through the time they have banked
+    def catch_up(self, rows: np.ndarray):
+        if len(rows) == 0:
+            return
+        self.integrate(self.pending_deltas[rows], rows)
+        # Catching up is not motion this tick, so it shouldn't be interpolated
+        self.previous_positions[rows] = self.positions[rows]
+        self.previous_angles[rows] = self.angles[rows]
+        self.pending_deltas[rows] = 0
+
+
+    # Catches up the rows that have banked time and are within distance of the edge of any of the points,
+    # so things that move fast outside the activity zone, like bullets, collide with up to date positions
+    def catch_up_near(self, points: np.ndarray, distance: float):
+        if len(points) == 0:
+            return
+        pending = np.flatnonzero(self.pending_deltas[:self.count] > 0)
+        offsets = self.positions[pending, None, :] - points[None, :, :]
+        reach = self.radii[pending] + distance
+        near = ((offsets * offsets).sum(axis=2) <= (reach * reach)[:, None]).any(axis=1)
+        self.catch_up(pending[near])
+
+
+# Level objects live in partitions by kind while they are part of the level. An object outside the store,
+# like one that was just created, deleted or pooled, or an object of a finished level, keeps its state in a
+# plain dict that is reused every time it is detached, so adding and removing objects doesn't allocate arrays.
+class EntityStore:
+    def __init__(self):
+        self.partitions: dict[str, EntityPartition] = {kind: EntityPartition(kind) for kind in ENTITY_KINDS}
+        self.tick = 0
+
+
+    def get_partition(self, kind: str) -> EntityPartition:
+        partition = self.partitions.get(kind)
+        if partition is None:
+            partition = EntityPartition(kind)
+            self.partitions[kind] = partition
+        return partition
+
+
+    def add(self, obj, kind: str):
+        target = self.get_partition(kind)
+        if obj.entity_partition is target:
+            return
+        if obj.entity_partition is not None:
+            self.remove(obj)
+        slot = target.append(obj)
+        for name, value in obj.detached_fields.items():
+            if name in target.fields:
+                getattr(target, name)[slot] = value
+        obj.entity_partition = target
+        obj.entity_slot = slot
+
+
+    def detach(self, obj):
+        partition: EntityPartition = obj.entity_partition
+        slot = obj.entity_slot
+        detached_fields = obj.detached_fields
+        for name in detached_fields:
+            row = getattr(partition, name)[slot]
+            detached_fields[name] = (float(row[0]), float(row[1])) if row.ndim else float(row)
+        obj.entity_partition = None
+        obj.entity_slot = -1
+
+
+    def remove(self, obj):
+        partition: EntityPartition | None = obj.entity_partition
+        if partition is None:
+            return
+        slot = obj.entity_slot
+        self.detach(obj)
+        partition.remove(slot)
+
+
+    # Detaches every object, e.g. when a new level is loaded
+    def clear(self):
+        for partition in self.partitions.values():
+            for obj in partition.objects:
+                self.detach(obj)
+            partition.clear()
+
+
+    def store_previous_states(self):
+        for partition in self.partitions.values():
+            partition.store_previous_states()
+
+
+    def begin_tick(self):
+        self.tick += 1
+        self.store_previous_states()
+
+
+    # Objects whose bounding box overlaps the rectangle, in draw order
+    def query_rect(self, min_x: float, min_y: float, max_x: float, max_y: float) -> list:
+        result = []
+        for partition in self.partitions.values():
+            if partition.count == 0:
+                continue
+            positions = partition.positions[:partition.count]
+            radii = partition.radii[:partition.count]
+            overlapping = np.flatnonzero(
+                (positions[:, 0] + radii > min_x) & (positions[:, 0] - radii < max_x) &
+                (positions[:, 1] + radii > min_y) & (positions[:, 1] - radii < max_y)
+            )
+            objects = partition.objects
+            result.extend(objects[i] for i in overlapping.tolist())
+        return result
+
+
+# Gives a new object its detached state, all zero. It joins a partition when it is added to the store.
+def init_entity(obj, kind: str):
+    obj.entity_partition = None
+    obj.entity_slot = -1
+    obj.detached_fields = {name: (0.0, 0.0) if shape else 0.0 for name, shape in get_partition_fields(kind).items()}
+
+
+# The Vector2 an EntityVector returns. Changing it in place, with x/y, update() or the *_ip methods,
+# writes it back to the entity. Vectors derived from it by arithmetic have no owner and are plain values.
+class EntityVectorView(Vector2):
+    __slots__ = ('entity_owner', 'entity_field')
+
+    def write_back(self):
+        owner = getattr(self, 'entity_owner', None)
+        if owner is not None:
+            set_entity_vector(owner, self.entity_field, self)
+
+    def __setattr__(self, name: str, value):
+        Vector2.__setattr__(self, name, value)
+        self.write_back()
+
+    def __setitem__(self, key, value):
+        Vector2.__setitem__(self, key, value)
+        self.write_back()
+
+
+def make_write_back_method(name: str):
+    def write_back_method(self, *args, **kwargs):
+        result = getattr(super(EntityVectorView, self), name)(*args, **kwargs)
+        self.write_back()
+        return result
+    write_back_method.__name__ = name
+    return write_back_method
+
+
+VECTOR_MUTATING_METHODS = ['update', 'scale_to_length', 'from_polar', '__iadd__', '__isub__', '__imul__', '__itruediv__', '__ifloordiv__'] + \
+    [name for name in dir(Vector2) if name.endswith('_ip')]
+for method_name in VECTOR_MUTATING_METHODS:
+    if hasattr(Vector2, method_name):
+        setattr(EntityVectorView, method_name, make_write_back_method(method_name))
+
+
+def set_entity_vector(obj, field: str, value):
+    partition = obj.entity_partition
+    if partition is None:
+        obj.detached_fields[field] = (float(value[0]), float(value[1]))
+        return
+    array = getattr(partition, field)
+    slot = obj.entity_slot
+    array[slot, 0] = value[0]
+    array[slot, 1] = value[1]
+
+
+# Attribute views onto the object's row, or onto its detached state while it is outside the store
+class EntityVector:
+    def __init__(self, field: str):
+        self.field = field
+
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            return self
+        partition = obj.entity_partition
+        if partition is None:
+            x, y = obj.detached_fields[self.field]
+        else:
+            array = getattr(partition, self.field)
+            slot = obj.entity_slot
+            x, y = array[slot, 0], array[slot, 1]
+        view = EntityVectorView(x, y)
+        Vector2.__setattr__(view, 'entity_owner', obj)
+        Vector2.__setattr__(view, 'entity_field', self.field)
+        return view
+
+    def __set__(self, obj, value):
+        set_entity_vector(obj, self.field, value)
+
+
+class EntityScalar:
+    def __init__(self, field: str):
+        self.field = field
+
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            return self
+        partition = obj.entity_partition
+        if partition is None:
+            return obj.detached_fields[self.field]
+        return float(getattr(partition, self.field)[obj.entity_slot])
+
+    def __set__(self, obj, value: float):
+        partition = obj.entity_partition
+        if partition is None:
+            obj.detached_fields[self.field] = float(value)
+            return
+        getattr(partition, self.field)[obj.entity_slot] = value
+
+
+entity_store = EntityStore()
@@ -2,10 +2,11 @@ from enum import Enum
 from pathlib import Path
 import sys
 import os
-from resource_manager import ResourceManager
-from particle.particle import ParticleEffect
+from resource_manager import ResourceManager, TextCache
+from particle.particle import ParticleSystem
 from util import CollisionCircle
 from ui.ui import UiHandler
+from audio import VoiceManager
 
 
 class GameStateEnum(Enum):
@@ -25,7 +26,9 @@ class GameState:
 
 
 resource_manager: ResourceManager = ResourceManager()
-particle_effects: list[ParticleEffect] = []
+text_cache: TextCache = TextCache()
+voice_manager: VoiceManager = VoiceManager(resource_manager)
+particle_system: ParticleSystem = ParticleSystem()
 added_level_objects: list[CollisionCircle] = []
 game_state = GameState(GameStateEnum.LEVEL)
 ui_handler: UiHandler = UiHandler([])
@@ -49,34 +52,53 @@ def set_game_state(state: GameState):
     game_state = state
 
 
+IMAGE_ASSETS = [
+    ('player', 'player.png'),
+    ('asteroid', 'asteroid.png'),
+    ('coin_asteroid', 'coin_asteroid.png'),
+    ('orbiter', 'orbiter.png'),
+    ('smart_orbiter', 'smart_orbiter.png'),
+    ('long_orbiter', 'long_orbiter.png'),
+
+    ('fire_rate_icon', 'shoot_upgrade.png'),
+    ('brakes_icon', 'brakes_upgrade.png'),
+    ('thrust_icon', 'fire_upgrade.png'),
+
+    ('space_bg', 'space_bg.png'),
+    ('menu_bg', 'menu_bg.png'),
+]
+SPRITESHEET_ASSETS = [
+    ('fragments', 'fragments.png', [8, 8]),
+    ('coin', 'coin.png', [8, 8]),
+    ('level_end_ss', 'level_end_ss.png', [25, 25]),
+    ('explosion', 'explosion.png', [200, 250]),
+]
+# The last flag marks sounds that are only needed on game over or in the upgrade menu, so they are decoded when first played
+SOUND_ASSETS = [
+    ('shoot', 'audio/shoot.wav', False),
+    ('hit', 'audio/hit.wav', False),
+    ('explosion', 'audio/explosion.wav', False),
+    ('coin', 'audio/coin.wav', False),
+    ('hook', 'audio/hook.wav', False),
+    ('blip', 'audio/blip.wav', False),
+    ('end_level', 'audio/end_level.wav', False),
+    ('death', 'audio/death.wav', True),
+    ('deltarune_explosion', 'audio/deltarune_explosion.mp3', True),
+    ('upgrade', 'audio/upgrade.wav', True),
+    # The hit sound again, on the menu channel
+    ('purchase_failed', 'audio/hit.wav', True),
+]
+# Pre-sliced pixels of every image and spritesheet, written by asset_bundle.py. Used instead of the PNGs when present.
+BUNDLE_PATH = os.path.join(ASSETS_PATH, 'assets.bundle')
+
+
 def load_resources():
     global resource_manager
-    resource_manager.load_image('player', f'{ASSETS_PATH}/player.png')
-    resource_manager.load_image('asteroid', f'{ASSETS_PATH}/asteroid.png')
-    resource_manager.load_image('coin_asteroid', f'{ASSETS_PATH}/coin_asteroid.png')
-    resource_manager.load_image('orbiter', f'{ASSETS_PATH}/orbiter.png')
-    resource_manager.load_image('smart_orbiter', f'{ASSETS_PATH}/smart_orbiter.png')
-    resource_manager.load_image('long_orbiter', f'{ASSETS_PATH}/long_orbiter.png')
-
-    resource_manager.load_image('fire_rate_icon', f'{ASSETS_PATH}/shoot_upgrade.png')
-    resource_manager.load_image('brakes_icon', f'{ASSETS_PATH}/brakes_upgrade.png')
-    resource_manager.load_image('thrust_icon', f'{ASSETS_PATH}/fire_upgrade.png')
-
-    resource_manager.load_image('space_bg', f'{ASSETS_PATH}/space_bg.png')
-    resource_manager.load_image('menu_bg', f'{ASSETS_PATH}/menu_bg.png')
-
-    resource_manager.load_spritesheet('fragments', f'{ASSETS_PATH}/fragments.png', [8, 8])
-    resource_manager.load_spritesheet('coin', f'{ASSETS_PATH}/coin.png', [8, 8])
-    resource_manager.load_spritesheet('level_end_ss', f'{ASSETS_PATH}/level_end_ss.png', [25, 25])
-    resource_manager.load_spritesheet('explosion', f'{ASSETS_PATH}/explosion.png', [200, 250])
-
-    resource_manager.load_sound('shoot', f'{ASSETS_PATH}/audio/shoot.wav')
-    resource_manager.load_sound('hit', f'{ASSETS_PATH}/audio/hit.wav')
-    resource_manager.load_sound('explosion', f'{ASSETS_PATH}/audio/explosion.wav')
-    resource_manager.load_sound('coin', f'{ASSETS_PATH}/audio/coin.wav')
-    resource_manager.load_sound('hook', f'{ASSETS_PATH}/audio/hook.wav')
-    resource_manager.load_sound('blip', f'{ASSETS_PATH}/audio/blip.wav')
-    resource_manager.load_sound('death', f'{ASSETS_PATH}/audio/death.wav')
-    resource_manager.load_sound('deltarune_explosion', f'{ASSETS_PATH}/audio/deltarune_explosion.mp3')
-    resource_manager.load_sound('upgrade', f'{ASSETS_PATH}/audio/upgrade.wav')
-    resource_manager.load_sound('end_level', f'{ASSETS_PATH}/audio/end_level.wav')
\ No newline at end of file
+    resource_manager.load_bundle(BUNDLE_PATH)
+    for image_id, file_name in IMAGE_ASSETS:
+        resource_manager.load_image(image_id, f'{ASSETS_PATH}/{file_name}')
+    for spritesheet_id, file_name, sprite_size in SPRITESHEET_ASSETS:
+        resource_manager.load_spritesheet(spritesheet_id, f'{ASSETS_PATH}/{file_name}', sprite_size)
+    for sound_id, file_name, lazy in SOUND_ASSETS:
+        resource_manager.load_sound(sound_id, f'{ASSETS_PATH}/{file_name}', lazy)
+    resource_manager.finish_loading()
@@ -0,0 +1,163 @@
+import os
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import argparse
+import random
+import time
+from typing import Callable
+import pygame
+
+import main
+import rng
+import globals
+from globals import GameStateEnum, ASSETS_PATH
+import state
+import util
+from level_gen import level_manager
+from player import Player
+from stars import StarfieldBackground
+from profiler import profiler, PHASES, PERCENTILES
+
+
+DEFAULT_FRAMES = 3600
+DEFAULT_DELTA = 1 / 60
+DEFAULT_SEED = 0
+DEFAULT_WINDOW_SIZE = (1024, 576)
+
+
+class ScriptedKeys:
+    def __init__(self, pressed: set[int]):
+        self.pressed = pressed
+
+    def __getitem__(self, key: int) -> bool:
+        return key in self.pressed
+
+
+class InputScript:
+    def __init__(self, segments: list[tuple[int, int, set[int]]], repeat: int=0):
+        self.segments = segments
+        self.repeat = repeat
+
+    # Each line is '<start frame> <end frame> <key name>...', e.g. '0 120 up z'
+    @staticmethod
+    def from_file(path: str, repeat: int=0) -> "InputScript":
+        segments = []
+        with open(path, 'r') as f:
+            for line in f:
+                line = line.split('#')[0].strip()
+                if not line:
+                    continue
+                start, end, *key_names = line.split()
+                segments.append((int(start), int(end), {pygame.key.key_code(name) for name in key_names}))
+        return InputScript(segments, repeat)
+
+    def get_keys(self, frame: int) -> ScriptedKeys:
+        if self.repeat > 0:
+            frame %= self.repeat
+        pressed: set[int] = set()
+        for start, end, keys in self.segments:
+            if start <= frame < end:
+                pressed |= keys
+        return ScriptedKeys(pressed)
+
+
+# Thrusts and shoots constantly while weaving left and right
+def get_default_script() -> InputScript:
+    return InputScript([
+        (0, 240, {pygame.K_UP, pygame.K_z}),
+        (60, 80, {pygame.K_LEFT}),
+        (140, 180, {pygame.K_RIGHT}),
+        (200, 240, {pygame.K_DOWN, pygame.K_x}),
+    ], repeat=240)
+
+
+class HeadlessResult:
+    def __init__(self, frames: int, elapsed: float, levels_completed: int, deaths: int, player: Player):
+        self.frames = frames
+        self.elapsed = elapsed
+        self.levels_completed = levels_completed
+        self.deaths = deaths
+        self.score = player.score
+        self.coins = player.coins
+        self.position = pygame.Vector2(player.position)
+
+    def __repr__(self) -> str:
+        ms_per_frame = self.elapsed / max(1, self.frames) * 1000
+        return (f'frames={self.frames} elapsed={self.elapsed:.3f}s ms/frame={ms_per_frame:.3f} '
+                f'levels={self.levels_completed} deaths={self.deaths} score={self.score} coins={self.coins} '
+                f'position=({self.position.x:.4f}, {self.position.y:.4f})')
+
+
+def run_headless(frames: int=DEFAULT_FRAMES, seed: int | random.Random=DEFAULT_SEED, delta: float=DEFAULT_DELTA,
+                 script: InputScript | None=None, window_size: tuple[int, int]=DEFAULT_WINDOW_SIZE,
+                 on_frame: Callable[[int], None] | None=None) -> HeadlessResult:
+    if isinstance(seed, random.Random):
+        rng.set_rng(seed)
+    else:
+        rng.seed(seed)
+    if script is None:
+        script = get_default_script()
+
+    win = pygame.display.set_mode(window_size)
+    font = pygame.font.Font(f'{ASSETS_PATH}/font/PixelTandysoft.ttf', 20)
+    globals.load_resources()
+    globals.keyboard_aim = True
+
+    level_manager.reset()
+    player = Player()
+    stars_background = StarfieldBackground(window_size)
+    state.switch_to_level(player)
+
+    levels_completed = 0
+    deaths = 0
+    start_time = time.perf_counter()
+    for frame in range(frames):
+        profiler.begin_frame()
+        pygame.event.pump()
+        profiler.mark('events')
+        main.level_update(delta, win, font, player, script.get_keys(frame), level_manager.level_objects, stars_background)
+        profiler.end_frame()
+        globals.voice_manager.end_frame()
+        util.rotation_cache.end_frame()
+        if on_frame is not None:
+            on_frame(frame)
+
+        # Skip the menus and keep simulating levels back to back
+        if globals.game_state.state == GameStateEnum.UPGRADE:
+            levels_completed += 1
+            state.switch_to_level(player)
+        elif globals.game_state.state == GameStateEnum.GAME_OVER:
+            deaths += 1
+            player.full_reset()
+            level_manager.reset()
+            state.switch_to_level(player)
+    elapsed = time.perf_counter() - start_time
+
+    return HeadlessResult(frames, elapsed, levels_completed, deaths, player)
+
+
+def main_headless():
+    parser = argparse.ArgumentParser(description='Simulate Masteroids without a display for profiling and benchmarking.')
+    parser.add_argument('--frames', type=int, default=DEFAULT_FRAMES, help='number of frames to simulate')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED, help='seed for the shared random number generator')
+    parser.add_argument('--delta', type=float, default=DEFAULT_DELTA, help='fixed frame delta in seconds')
+    parser.add_argument('--script', type=str, default=None, help='input script file, one "<start> <end> <key>..." segment per line')
+    parser.add_argument('--repeat', type=int, default=0, help='loop the input script every N frames')
+    parser.add_argument('--profile-csv', type=str, default=None, help='write per-frame phase timings to this CSV file')
+    args = parser.parse_args()
+
+    if args.profile_csv:
+        profiler.open_csv(args.profile_csv)
+    script = InputScript.from_file(args.script, args.repeat) if args.script else None
+    result = run_headless(args.frames, args.seed, args.delta, script)
+    profiler.close_csv()
+    print(result)
+    if profiler.history_count > 0:
+        percentiles = profiler.get_percentiles()
+        for i, phase in enumerate(PHASES + ['total']):
+            print(f'{phase:>13}' + ''.join(f'  p{p}={percentiles[j, i]:.3f}ms' for j, p in enumerate(PERCENTILES)))
+
+
+if __name__ == '__main__':
+    main_headless()
@@ -1,104 +1,197 @@
 import random
 import math
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable
 import pygame
 from pygame import Vector2, Surface
 import util
 from objects.asteroid import Asteroid, CoinAsteroid
 from objects.enemy import Orbiter, SmartOrbiter, LongRangeOrbiter, Enemy
 from objects.level_end import LevelEnd
+from spatial_hash import SpatialHash
+from path_query import PathQuery
+from rng import rng
+from entity_store import entity_store
 
 
-def generate_path(start: Vector2, end: Vector2, amount_points: int, angle_variance: float, length_variance: float) -> list[Vector2]:
+level_executor = ThreadPoolExecutor(max_workers=1)
+
+
+def generate_path(start: Vector2, end: Vector2, amount_points: int, angle_variance: float, length_variance: float,
+                  level_rng: random.Random=rng) -> list[Vector2]:
     points: list[Vector2] = [start]
     average_line_length = start.distance_to(end) / (amount_points + 1)
     current_point = Vector2(start)
     for i in range(amount_points):
         towards_end = (end - current_point).normalize()
-        shift_vector = towards_end.rotate(random.uniform(-angle_variance, angle_variance))
-        shift_vector *= average_line_length + random.uniform(-length_variance, length_variance)
+        shift_vector = towards_end.rotate(level_rng.uniform(-angle_variance, angle_variance))
+        shift_vector *= average_line_length + level_rng.uniform(-length_variance, length_variance)
         current_point += shift_vector
         points.append(Vector2(current_point))
     points.append(end)
     return points
 
 
-def draw_path(surf: Surface, view_pos: Vector2, points: list[Vector2]):
-    for i, point in enumerate(points):
-        screen_coordinate = util.world_to_screen(surf, view_pos, point, util.RENDER_SCALE)
-        if i < len(points)-1:
-            p2_screen_coordinate = util.world_to_screen(surf, view_pos, points[i+1], util.RENDER_SCALE)
-            pygame.draw.line(surf, (64, 64, 64), screen_coordinate, p2_screen_coordinate)
-        util.draw_circle_alpha(surf, (128, 128, 128), 128, screen_coordinate, 5)
+PATH_CHUNK_SIZE = 256
+PATH_LINE_COLOR = (64, 64, 64)
+PATH_MARKER_COLOR = (128, 128, 128)
+PATH_MARKER_ALPHA = 128
+PATH_MARKER_RADIUS = 5
+
+path_marker: Surface | None = None
+
+def get_path_marker() -> Surface:
+    global path_marker
+    if path_marker is None:
+        path_marker = Surface((PATH_MARKER_RADIUS * 2, PATH_MARKER_RADIUS * 2), pygame.SRCALPHA)
+        pygame.draw.circle(path_marker, (*PATH_MARKER_COLOR, PATH_MARKER_ALPHA), (PATH_MARKER_RADIUS, PATH_MARKER_RADIUS), PATH_MARKER_RADIUS)
+    return path_marker
+
+
+# The level path pre-rendered once into square chunks of world pixels. Only chunks the path touches exist,
+# and only the ones overlapping the viewport are drawn.
+class PathLayer:
+    def __init__(self, points: list[Vector2], chunk_size: int=PATH_CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self.chunks: dict[tuple[int, int], Surface] = {}
+
+        pixel_points = [point * util.RENDER_SCALE for point in points]
+        for p1, p2 in zip(pixel_points, pixel_points[1:]):
+            for chunk in self.get_overlapping_chunks(min(p1.x, p2.x), min(p1.y, p2.y), max(p1.x, p2.x), max(p1.y, p2.y)):
+                offset = Vector2(chunk) * chunk_size
+                pygame.draw.line(self.get_chunk(chunk), PATH_LINE_COLOR, p1 - offset, p2 - offset)
+
+        marker = get_path_marker()
+        for point in pixel_points:
+            for chunk in self.get_overlapping_chunks(point.x - PATH_MARKER_RADIUS, point.y - PATH_MARKER_RADIUS,
+                                                     point.x + PATH_MARKER_RADIUS, point.y + PATH_MARKER_RADIUS):
+                offset = Vector2(chunk) * chunk_size
+                self.get_chunk(chunk).blit(marker, point - offset - Vector2(PATH_MARKER_RADIUS, PATH_MARKER_RADIUS))
+
 
+    def get_chunk(self, chunk: tuple[int, int]) -> Surface:
+        surf = self.chunks.get(chunk)
+        if surf is None:
+            surf = Surface((self.chunk_size, self.chunk_size), pygame.SRCALPHA)
+            self.chunks[chunk] = surf
+        return surf
 
-def generate_asteroid(position: Vector2) -> Asteroid:
-    ast_size = random.randint(4, 12) / 2.0
-    if random.randrange(0, 7) == 0:
-        return CoinAsteroid(position, ast_size, Vector2(random.uniform(-1, 1), random.uniform(-1, 1)), random.uniform(-10, 10))
-    return Asteroid(position, ast_size, Vector2(random.uniform(-1, 1), random.uniform(-1, 1)), random.uniform(-10, 10))
 
+    def get_overlapping_chunks(self, min_x: float, min_y: float, max_x: float, max_y: float) -> list[tuple[int, int]]:
+        first_x, first_y = math.floor(min_x / self.chunk_size), math.floor(min_y / self.chunk_size)
+        last_x, last_y = math.floor(max_x / self.chunk_size), math.floor(max_y / self.chunk_size)
+        return [(x, y) for x in range(first_x, last_x + 1) for y in range(first_y, last_y + 1)]
 
-def generate_orbiter(position: Vector2, difficulty: float) -> Enemy:
+
+    def draw(self, surf: Surface, view_pos: Vector2):
+        surf_width, surf_height = surf.get_size()
+        # Screen position of the world pixel origin
+        origin = Vector2(surf_width / 2.0, surf_height / 2.0) - view_pos * util.RENDER_SCALE
+        blit_sequence = []
+        for chunk in self.get_overlapping_chunks(-origin.x, -origin.y, surf_width - origin.x, surf_height - origin.y):
+            chunk_surf = self.chunks.get(chunk)
+            if chunk_surf is not None:
+                blit_sequence.append((chunk_surf, (origin.x + chunk[0] * self.chunk_size, origin.y + chunk[1] * self.chunk_size)))
+        surf.blits(blit_sequence, doreturn=False)
+
+
+# Object specs are (constructor, arguments) pairs, so levels can be generated off the main thread
+# and only instantiated when they are loaded.
+ObjectSpec = tuple[Callable[..., util.LevelObject], tuple]
+
+
+def generate_asteroid(position: Vector2, level_rng: random.Random=rng) -> ObjectSpec:
+    ast_size = level_rng.randint(4, 12) / 2.0
+    if level_rng.randrange(0, 7) == 0:
+        return CoinAsteroid, (position, ast_size, Vector2(level_rng.uniform(-1, 1), level_rng.uniform(-1, 1)), level_rng.uniform(-10, 10))
+    return Asteroid, (position, ast_size, Vector2(level_rng.uniform(-1, 1), level_rng.uniform(-1, 1)), level_rng.uniform(-10, 10))
+
+
+def generate_orbiter(position: Vector2, difficulty: float, level_rng: random.Random=rng) -> ObjectSpec:
     if difficulty < 3:
-        return Orbiter(position)
+        return Orbiter, (position,)
     if difficulty < 6:
-        if random.randrange(0, 10) < 4:
-            return SmartOrbiter(position)
-        return Orbiter(position)
-    r = random.randrange(0, 10)
+        if level_rng.randrange(0, 10) < 4:
+            return SmartOrbiter, (position,)
+        return Orbiter, (position,)
+    r = level_rng.randrange(0, 10)
     if r < 5:
-        return Orbiter(position)
+        return Orbiter, (position,)
     if r < 8:
-        return SmartOrbiter(position)
-    return LongRangeOrbiter(position)
+        return SmartOrbiter, (position,)
+    return LongRangeOrbiter, (position,)
 
 
-def generate_object(position: Vector2, difficulty: float) -> util.LevelObject:
+def generate_object(position: Vector2, difficulty: float, level_rng: random.Random=rng) -> ObjectSpec:
     orbiter_chance = -4*difficulty+90 if difficulty < 10 else 50
-    r = random.randrange(0, 100)
+    r = level_rng.randrange(0, 100)
     if r < orbiter_chance:
-        return generate_asteroid(position)
-    return generate_orbiter(position, difficulty)
+        return generate_asteroid(position, level_rng)
+    return generate_orbiter(position, difficulty, level_rng)
 
 
-# Creates a path and populates it with objects.
-def generate_level(difficulty: int) -> tuple[list[Vector2], list[util.LevelObject]]:
+# Creates a path and the specs of the objects that populate it.
+def generate_level_spec(difficulty: int, level_rng: random.Random=rng) -> tuple[list[Vector2], list[ObjectSpec]]:
     amount_points = math.floor(0.5*difficulty + 8) if difficulty < 14 else 15
     average_amount_objects = math.floor(4 * math.sqrt(difficulty))
     object_distance = 50
 
-    end_point = Vector2.from_polar((random.uniform(350, 450), random.uniform(0, 360)))
-    amount_points += random.randrange(-1, 1)
-    path_points = generate_path(Vector2(0, 0), end_point, amount_points, 45, 3)
+    end_point = Vector2.from_polar((level_rng.uniform(350, 450), level_rng.uniform(0, 360)))
+    amount_points += level_rng.randrange(-1, 1)
+    path_points = generate_path(Vector2(0, 0), end_point, amount_points, 45, 3, level_rng)
 
 
-    level_objects: list[util.LevelObject] = [
-        LevelEnd(end_point)
+    object_specs: list[ObjectSpec] = [
+        (LevelEnd, (end_point,))
     ]
     for p1, p2 in zip(path_points[1:], path_points[2:]):
         line_length = p1.distance_to(p2)
         shift_vector = (p2 - p1).normalize()
         perp_vector = shift_vector.rotate(90)
-        for i in range(average_amount_objects + random.randint(-1, 1)):
-            obj_line_position = shift_vector * random.uniform(0, line_length) + p1
-            obj_position = obj_line_position + (perp_vector * random.uniform(-object_distance, object_distance))
+        for i in range(average_amount_objects + level_rng.randint(-1, 1)):
+            obj_line_position = shift_vector * level_rng.uniform(0, line_length) + p1
+            obj_position = obj_line_position + (perp_vector * level_rng.uniform(-object_distance, object_distance))
             if obj_position.distance_to((0, 0)) < 30:
                 continue
-            obj = generate_object(obj_position, difficulty)
-            level_objects.append(obj)
-    return (path_points, level_objects)
+            object_specs.append(generate_object(obj_position, difficulty, level_rng))
+    return (path_points, object_specs)
 
 
+def instantiate_objects(object_specs: list[ObjectSpec]) -> list[util.LevelObject]:
+    return [constructor(*args) for constructor, args in object_specs]
+
 
 class LevelManager:
     def __init__(self):
         self.difficulty = 0
         self.path_points: list[Vector2] = []
         self.level_objects: list[util.LevelObject] = []
+        self.spatial_hash = SpatialHash()
+        self.path_query: PathQuery | None = None
+        self.path_layer: PathLayer | None = None
+        self.pending_level: Future | None = None
+
+    # Starts generating the next level in the background, e.g. while a menu is showing
+    def prepare_next_level(self):
+        if self.pending_level is not None:
+            return
+        # The worker gets its own generator, seeded from the shared one, so results don't depend on thread timing
+        level_rng = random.Random(rng.getrandbits(64))
+        self.pending_level = level_executor.submit(generate_level_spec, self.difficulty + 1, level_rng)
 
     def load_next_level(self):
+        self.prepare_next_level()
+        path_points, object_specs = self.pending_level.result()
+        self.pending_level = None
+
         self.difficulty += 1
-        self.path_points, self.level_objects = generate_level(self.difficulty)
+        self.path_points = path_points
+        entity_store.clear()
+        self.level_objects = instantiate_objects(object_specs)
+        for obj in self.level_objects:
+            entity_store.add(obj, obj.ENTITY_KIND)
+        self.path_query = PathQuery(self.path_points)
+        self.path_layer = PathLayer(self.path_points)
     
     def reset(self):
         self.__init__()
@@ -1,41 +1,116 @@
+import sys
+from startup import startup_report, STARTUP_REPORT_FLAG
+# Import timing has to start before the game modules load, so this flag is checked ahead of parse_args()
+if STARTUP_REPORT_FLAG in sys.argv:
+    startup_report.enable()
+
+import argparse
+import numpy as np
 import pygame
 pygame.init()
 pygame.mixer.init()
 
 from player import Player
-from level_gen import level_manager, draw_path
+from level_gen import level_manager
 import util
-from util import CollisionCircle
 import globals
-from globals import particle_effects, added_level_objects, resource_manager, game_state, GameStateEnum, ui_handler, ASSETS_PATH
+from globals import particle_system, added_level_objects, resource_manager, text_cache, voice_manager, game_state, GameStateEnum, ui_handler, ASSETS_PATH
 from resource_manager import AnimationManager
+from objects.asteroid import Asteroid
+from objects.enemy import Orbiter, SmartOrbiter
 from objects.coin import Coin
-from objects.enemy import Enemy
 import state
 from stars import StarfieldBackground
-
+from timestep import FixedTimestep
+from profiler import profiler
+from object_pool import release_to_pool
+from entity_store import entity_store
+startup_report.mark('imports')
+
+
+TICK_RATE = 60
+RENDER_RATE = 60
+MAX_CATCH_UP_STEPS = 5
+
+# Objects within this distance of the player, or on screen, are simulated every tick.
+# It is larger than every enemy view distance, so nothing far away reacts to the player.
+SIMULATION_ACTIVE_DISTANCE = 80.0
+SIMULATION_ACTIVE_MARGIN = 10.0
+# Objects outside it are simulated every this many ticks
+SIMULATION_LOD_INTERVAL = 6
+# Sleeping objects within this distance of a bullet are caught up before collisions. It is well over how far
+# a bullet can move in one tick.
+SIMULATION_BULLET_DISTANCE = 5.0
 
 MAX_DISTANCE_FROM_PATH = 60.0
 DANGER_OVERLAY_DISTANCE = 30.0
 OUT_OF_BOUNDS_FORCE_STRENGTH = 5.0
 
+HUD_COIN_ICON_SIZE = 16
+
+
 def draw_label(surf: pygame.Surface, font: pygame.font.Font, text: str, position: tuple[int, int]):
-    surf.blit(font.render(text, True, (255, 255, 255)), position)
+    surf.blit(text_cache.render(font, text), position)
+
+
+def get_coin_icon() -> pygame.Surface:
+    return resource_manager.get_scaled_spritesheet('coin', HUD_COIN_ICON_SIZE)[0]
+
+
+# The score and coin counter, only recomposed when the values they show change
+class HudLayer:
+    def __init__(self):
+        self.surface: pygame.Surface | None = None
+        self.shown_values = None
+
+    def compose(self, font: pygame.font.Font, score: int, coins: int):
+        score_label = text_cache.render(font, f'Score: {score}')
+        coins_label = text_cache.render(font, f'x {coins}')
+        width = max(5 + score_label.get_width(), 30 + coins_label.get_width())
+        height = max(5 + score_label.get_height(), 30 + HUD_COIN_ICON_SIZE, 23 + coins_label.get_height())
+        self.surface = pygame.Surface((width, height), pygame.SRCALPHA)
+        self.surface.blit(score_label, (5, 5))
+        self.surface.blit(get_coin_icon(), (5, 30))
+        self.surface.blit(coins_label, (30, 23))
+
+    def draw(self, surf: pygame.Surface, font: pygame.font.Font, score: int, coins: int):
+        values = (font, score, coins)
+        if values != self.shown_values:
+            self.compose(font, score, coins)
+            self.shown_values = values
+        surf.blit(self.surface, (0, 0))
+
+
+hud_layer = HudLayer()
+background_cache = util.BackgroundCache()
+danger_overlay = util.ColorOverlay((5, 5, 15))
+
+
+# Classes whose entity partitions are updated all at once, and the kinds that still update object by object
+BATCH_UPDATED_CLASSES = [Asteroid, Orbiter, SmartOrbiter, Coin]
+SELF_UPDATING_KINDS = ['level_end', 'object']
+
 
+def get_active_distance(screen_size: pygame.Vector2) -> float:
+    return max(SIMULATION_ACTIVE_DISTANCE, screen_size.length() / 2 / util.RENDER_SCALE + SIMULATION_ACTIVE_MARGIN)
 
-def get_rendered_objects(win: pygame.Surface, view_pos: pygame.Vector2, level_objects: list[CollisionCircle]) -> list[CollisionCircle]:
+
+def get_rendered_objects(win: pygame.Surface, view_pos: pygame.Vector2) -> list[util.LevelObject]:
     viewport = util.get_viewport_rect(win, view_pos)
-    return [o for o in level_objects if viewport.colliderect(o.get_bounding_box())]
+    return entity_store.query_rect(viewport.x, viewport.y, viewport.x + viewport.width, viewport.y + viewport.height)
 
 
+# Compacts the list in place in a single pass, returning deleted pooled objects to their pool
 def delete_queued_objects(level_objects: list[util.LevelObject]):
-    i = 0
-    while i < len(level_objects):
-        if level_objects[i].queue_delete:
-            level_objects.pop(i)
-            i -= 1
+    alive_count = 0
+    for obj in level_objects:
+        if obj.queue_delete:
+            entity_store.remove(obj)
+            release_to_pool(obj)
         else:
-            i += 1
+            level_objects[alive_count] = obj
+            alive_count += 1
+    del level_objects[alive_count:]
 
 
 class GameOverHandler:
@@ -51,7 +126,7 @@ class GameOverHandler:
         if self.timer > 1 and self.timer < 2.8:
             if not self.played_sound:
                 self.played_sound = True
-                resource_manager.get_sound('deltarune_explosion').play()
+                voice_manager.play('deltarune_explosion')
             self.animation_manager.update(delta)
             surf_center = pygame.Vector2(surf.get_size()) / 2
             sprite = self.animation_manager.get_current_frame()
@@ -71,83 +146,123 @@ class GameOverHandler:
 
 
 def menu_update(win: pygame.Surface, font: pygame.font.Font):
-    util.tile_surface(win, resource_manager.get_image('menu_bg'), 5)
-    title_label = font.render('Masteroids', True, (255, 255, 255))
+    background_cache.draw(win, resource_manager.get_image('menu_bg'), 5)
+    title_label = text_cache.render(font, 'Masteroids')
     title_label_pos = pygame.Vector2(win.get_size()) / 2 - pygame.Vector2(title_label.get_size()) / 2 + pygame.Vector2(0, -200)
     win.blit(title_label, title_label_pos)
 
     prev_selected_element = ui_handler.selected_element
     ui_handler.update()
     if prev_selected_element is None and ui_handler.selected_element:
-        resource_manager.get_sound('blip').play()
+        voice_manager.play('blip')
     ui_handler.draw(win, font, offset=pygame.Vector2(0, title_label_pos.y + 100))
 
 
 
-def level_update(delta: float, win: pygame.Surface, font: pygame.font.Font, player: Player, keys: pygame.key.ScancodeWrapper, 
-                 level_objects: list[util.LevelObject], path_points: list[pygame.Vector2], stars_background: StarfieldBackground):
-    player.handle_input(pygame.Vector2(win.get_size()), delta, keys)
-    player.update(delta, level_objects)
-
-    for obj in level_objects:
-        if isinstance(obj, (Coin, Enemy)):
-            obj.update(delta, player.position)
+# Advances the level simulation by one step and returns the player's distance from the path
+def level_tick(delta: float, screen_size: pygame.Vector2, player: Player, keys: pygame.key.ScancodeWrapper,
+               level_objects: list[util.LevelObject]) -> float:
+    player.store_previous_state()
+    entity_store.begin_tick()
+    player.handle_input(screen_size, delta, keys)
+    profiler.mark('input')
+    # Bullets fly far outside the activity zone, so whatever they could hit this tick is brought up to date first
+    bullet_positions = np.array([(bullet.position.x, bullet.position.y) for bullet in player.bullets]).reshape(-1, 2)
+    for cls in BATCH_UPDATED_CLASSES:
+        if cls.SIMULATION_LOD:
+            entity_store.get_partition(cls.ENTITY_KIND).catch_up_near(bullet_positions, SIMULATION_BULLET_DISTANCE)
+    level_manager.spatial_hash.rebuild_from_store(entity_store)
+    profiler.mark('broadphase')
+    player.update(delta, level_manager.spatial_hash)
+    profiler.mark('player')
+
+    active_distance = get_active_distance(screen_size)
+    for cls in BATCH_UPDATED_CLASSES:
+        partition = entity_store.get_partition(cls.ENTITY_KIND)
+        if cls.SIMULATION_LOD:
+            rows = partition.schedule(player.position, active_distance, entity_store.tick, SIMULATION_LOD_INTERVAL, delta,
+                                      cls.get_awake_mask(partition))
         else:
+            rows = partition.get_rows()
+        cls.update_batch(partition, rows, delta, player.position)
+    for kind in SELF_UPDATING_KINDS:
+        for obj in entity_store.get_partition(kind).objects:
             obj.update(delta)
+    profiler.mark('objects')
     
     delete_queued_objects(level_objects)
+    # Objects spawned this tick join the store here, so they are first updated next tick
+    for obj in added_level_objects:
+        entity_store.add(obj, obj.ENTITY_KIND)
     level_objects.extend(added_level_objects)
     added_level_objects.clear()
+    profiler.mark('delete_merge')
 
     # check if player is too far from path
-    path_distance, path_point = util.closest_segment_point_distance(player.position, path_points)
+    path_distance, path_point = level_manager.path_query.closest_point(player.position)
     if path_distance > MAX_DISTANCE_FROM_PATH:
         force_vec = (path_point - player.position).normalize() * (path_distance-MAX_DISTANCE_FROM_PATH) * OUT_OF_BOUNDS_FORCE_STRENGTH
         player.velocity += force_vec * delta
+    profiler.mark('path_query')
+
+    particle_system.update(delta)
+    profiler.mark('particles')
+    return path_distance
+
+
+def level_draw(alpha: float, win: pygame.Surface, font: pygame.font.Font, player: Player,
+               stars_background: StarfieldBackground, path_distance: float):
+    util.set_interpolation_alpha(alpha)
+    view_pos = player.get_render_position()
 
     win.fill((0, 0, 0))
 
-    stars_background.update(player.position)
+    stars_background.update(view_pos)
     stars_background.draw(win)
+    profiler.mark('starfield')
 
     if path_distance > DANGER_OVERLAY_DISTANCE:
         overlay_alpha = min(util.map_range(path_distance-DANGER_OVERLAY_DISTANCE, 0, MAX_DISTANCE_FROM_PATH-DANGER_OVERLAY_DISTANCE, 0, 255), 255)
-        overlay = pygame.Surface(win.get_size(), pygame.SRCALPHA)
-        overlay.fill((5, 5, 15, overlay_alpha))
-        win.blit(overlay, (0, 0))
+        danger_overlay.draw(win, overlay_alpha)
     
-    draw_path(win, player.position, path_points)
+    level_manager.path_layer.draw(win, view_pos)
+    profiler.mark('path_draw')
 
-    for effect in particle_effects:
-        effect.tickdraw(delta, win, player.position)
+    particle_system.draw(win, view_pos, alpha)
+    profiler.mark('particles')
 
 
-    rendered_objects = get_rendered_objects(win, player.position, level_objects)
-    for obj in rendered_objects:
-        obj.draw(win, player.position)
+    rendered_objects = get_rendered_objects(win, view_pos)
+    win.blits([obj.get_blit(win, view_pos) for obj in rendered_objects], doreturn=False)
     player.draw(win)
+    profiler.mark('object_draw')
 
     
-    draw_label(win, font, f'Score: {player.score}', (5, 5))
-    coin_icon = pygame.transform.scale_by(resource_manager.get_spritesheet_image('coin', 0), 2)
-    win.blit(coin_icon, (5, 30))
-    draw_label(win, font, f'x {player.coins}', (30, 23))
+    hud_layer.draw(win, font, player.score, player.coins)
+    util.set_interpolation_alpha(1.0)
+    profiler.mark('hud')
+
+
+def level_update(delta: float, win: pygame.Surface, font: pygame.font.Font, player: Player, keys: pygame.key.ScancodeWrapper, 
+                 level_objects: list[util.LevelObject], stars_background: StarfieldBackground):
+    path_distance = level_tick(delta, pygame.Vector2(win.get_size()), player, keys, level_objects)
+    level_draw(1.0, win, font, player, stars_background, path_distance)
 
 
 def upgrade_update(win: pygame.Surface, title_font: pygame.font.Font, font: pygame.font.Font, player: Player):
     prev_selected_element = ui_handler.selected_element
     ui_handler.update()
     if prev_selected_element is None and ui_handler.selected_element:
-        resource_manager.get_sound('blip').play()
-    util.tile_surface(win, resource_manager.get_image('space_bg'), 3)
+        voice_manager.play('blip')
+    background_cache.draw(win, resource_manager.get_image('space_bg'), 3)
     ui_handler.draw(win, font, offset=pygame.Vector2(0, 150))
 
-    upgrades_title = title_font.render('Upgrades', True, (255, 255, 255))
+    upgrades_title = text_cache.render(title_font, 'Upgrades')
     upgrades_title_position = pygame.Vector2(win.get_size()) / 2 - pygame.Vector2(upgrades_title.get_size()) / 2
     upgrades_title_position.y = 25
     win.blit(upgrades_title, upgrades_title_position)
 
-    coin_icon = pygame.transform.scale_by(resource_manager.get_spritesheet_image('coin', 0), 2)
+    coin_icon = get_coin_icon()
     screen_center_x = win.get_size()[0] / 2
     win.blit(coin_icon, (screen_center_x-27, 107))
     draw_label(win, font, f'x {player.coins}', (screen_center_x, 100))
@@ -163,26 +278,38 @@ def game_over_update(delta: float, win: pygame.Surface, title_font: pygame.font.
     game_over_handler.tickdraw(delta, win, player)
 
     if game_over_handler.draw_game_over:
-        label = title_font.render('GAME OVER', True, (255, 255, 255))
+        label = text_cache.render(title_font, 'GAME OVER')
         win_half_size = pygame.Vector2(win.get_size()) / 2
         label_pos = win_half_size - pygame.Vector2(label.get_size()) / 2
-        score_label = font.render(f'Score: {player.score}', True, (255, 255, 255))
+        score_label = text_cache.render(font, f'Score: {player.score}')
         score_label_pos = win_half_size - pygame.Vector2(score_label.get_size()) / 2 + pygame.Vector2(0, 50)
-        level_label = font.render(f'You made it to level {level_manager.difficulty}', True, (255, 255, 255))
+        level_label = text_cache.render(font, f'You made it to level {level_manager.difficulty}')
         level_label_pos = win_half_size - pygame.Vector2(level_label.get_size()) / 2 + pygame.Vector2(0, 80)
         win.blit(label, label_pos)
         win.blit(score_label, score_label_pos)
         win.blit(level_label, level_label_pos)
 
 
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Masteroids')
+    parser.add_argument('--profile-csv', type=str, default=None, help='write per-frame phase timings to this CSV file')
+    parser.add_argument('--profile-overlay', action='store_true', help='show the frame profiler overlay on start (toggle with F3)')
+    parser.add_argument(STARTUP_REPORT_FLAG, action='store_true', help='print import, resource load and first frame timings at startup')
+    return parser.parse_args()
+
+
 def main():
-    global added_level_objects, particle_effects, game_state, level_manager
+    global added_level_objects, particle_system, game_state, level_manager
+    # Parsed before anything is loaded, so --help and bad flags exit without opening a window
+    args = parse_args()
     win = pygame.display.set_mode((1024, 576), pygame.DOUBLEBUF | pygame.RESIZABLE | pygame.HWSURFACE)
     pygame.display.set_caption('Masteroids')
     clock = pygame.time.Clock()
     title_font = pygame.font.Font(f'{ASSETS_PATH}/font/Pixeboy.ttf', 75)
     font = pygame.font.Font(f'{ASSETS_PATH}/font/PixelTandysoft.ttf', 20)
+    startup_report.mark('display')
     globals.load_resources()
+    startup_report.mark('resources')
 
     game_over_handler = GameOverHandler()
 
@@ -190,30 +317,62 @@ def main():
 
     stars_background = StarfieldBackground((1280, 720))
     
+    if args.profile_csv:
+        profiler.open_csv(args.profile_csv)
+    if args.profile_overlay:
+        profiler.toggle_overlay()
+
     state.switch_to_menu(player)
+    startup_report.mark('setup')
+    timestep = FixedTimestep(TICK_RATE, MAX_CATCH_UP_STEPS)
+    path_distance = 0.0
     delta: float = 0.0
     run = True
     while run:
+        profiler.begin_frame()
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 run = False
             if event.type == pygame.WINDOWRESIZED:
                 stars_background.resize(win.get_size())
+                background_cache.clear()
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                profiler.toggle_overlay()
         
         keys = pygame.key.get_pressed()
+        profiler.mark('events')
         if game_state.state == GameStateEnum.MENU:
             menu_update(win, title_font)
         elif game_state.state == GameStateEnum.PAUSE:
             pass
         elif game_state.state == GameStateEnum.LEVEL:
-            level_update(delta, win, font, player, keys, level_manager.level_objects, level_manager.path_points, stars_background)
+            for _ in range(timestep.advance(delta)):
+                path_distance = level_tick(timestep.step, pygame.Vector2(win.get_size()), player, keys, level_manager.level_objects)
+                if game_state.state != GameStateEnum.LEVEL:
+                    timestep.reset()
+                    break
+            else:
+                level_draw(timestep.get_alpha(), win, font, player, stars_background, path_distance)
         elif game_state.state == GameStateEnum.UPGRADE:
             upgrade_update(win, title_font, font, player)
         elif game_state.state == GameStateEnum.GAME_OVER:
             game_over_update(delta, win, title_font, font, player, game_over_handler)
+        profiler.mark('ui')
+
+        profiler.draw_overlay(win, font)
+        profiler.mark('overlay')
 
-        delta = clock.tick(60) / 1000.0
+        delta = clock.tick(RENDER_RATE) / 1000.0
+        profiler.mark('idle')
         pygame.display.flip()
+        profiler.mark('flip')
+        profiler.end_frame()
+        voice_manager.end_frame()
+        util.rotation_cache.end_frame()
+        if startup_report.is_pending():
+            startup_report.finish(resource_manager.get_load_metrics())
+
+    profiler.close_csv()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,40 @@
+from typing import Callable, Generic, TypeVar
+
+
+T = TypeVar('T')
+
+MAX_FREE_OBJECTS = 1024
+
+
+# Free-list pool for short-lived objects. Pooled classes implement reset() with the same arguments as
+# their constructor, and objects handed out by a pool remember it in their `pool` attribute.
+class ObjectPool(Generic[T]):
+    def __init__(self, factory: Callable[..., T], max_free: int=MAX_FREE_OBJECTS):
+        self.factory = factory
+        self.max_free = max_free
+        self.free: list[T] = []
+
+
+    def acquire(self, *args, **kwargs) -> T:
+        if self.free:
+            obj = self.free.pop()
+            obj.reset(*args, **kwargs)
+        else:
+            obj = self.factory(*args, **kwargs)
+        obj.pool = self
+        return obj
+
+
+    def release(self, obj: T):
+        if len(self.free) < self.max_free:
+            self.free.append(obj)
+
+
+    def clear(self):
+        self.free.clear()
+
+
+def release_to_pool(obj):
+    pool = getattr(obj, 'pool', None)
+    if pool is not None:
+        pool.release(obj)
@@ -1,18 +1,21 @@
 import math
-import random
+import numpy as np
+from rng import rng, cosmetic_rng
 import pygame
 from pygame import Vector2, Surface
 
 import util
 from particle.particle import ParticleEffect
-from globals import resource_manager, particle_effects, added_level_objects
-from objects.coin import Coin
+from globals import resource_manager, voice_manager, particle_system, added_level_objects
+from objects.coin import coin_pool
+from entity_store import EntityPartition
 
 
 class Asteroid(util.LevelObject):
-    def __init__(self, position: Vector2, radius: float, velocity: Vector2, angular_velocity: float, sprite: Surface=None):
-        if sprite is None:
-            sprite = resource_manager.get_image('asteroid')
+    ENTITY_KIND = 'asteroid'
+
+    def __init__(self, position: Vector2, radius: float, velocity: Vector2, angular_velocity: float, sprite_id: str='asteroid'):
+        sprite = resource_manager.get_scaled(sprite_id, util.get_sprite_size(radius))
         super().__init__(position, radius, velocity, angular_velocity, sprite)
 
         self.health = math.floor(1.25 * math.sqrt(radius))
@@ -20,13 +23,13 @@ class Asteroid(util.LevelObject):
     
 
     def destroy(self, player):
-        global resource_manager, particle_effects
+        global resource_manager, particle_system
         self.queue_delete = True
         sprites = resource_manager.get_full_spritesheet('fragments')
         particle_count = math.floor(8 * math.sqrt(self.radius) + 3)
-        effect = ParticleEffect(particle_count, self.position, 0, 360, 0, 200, 3.5, 1, 2, 0.2, sprites)
-        particle_effects.append(effect)
-        resource_manager.get_sound('explosion').play()
+        effect = ParticleEffect.create(particle_count, self.position, 0, 360, 0, 200, 3.5, 1, 2, 0.2, sprites)
+        particle_system.emit(effect)
+        voice_manager.play('explosion')
         player.score += 50
 
 
@@ -35,36 +38,36 @@ class Asteroid(util.LevelObject):
         if self.health <= 0:
             self.destroy(player)
         else:
-            resource_manager.get_sound('hit').play()
+            voice_manager.play('hit')
             self.shake_cooldown = 0.1
 
     
-    def update(self, delta: float) -> bool:
-        super().update(delta)
-        self.shake_cooldown = util.move_toward(self.shake_cooldown, 0, delta)
+    # Asteroids only drift, spin and settle, so their rows are integrated in one step
+    @staticmethod
+    def update_batch(partition: EntityPartition, rows: np.ndarray, delta: float, player_position: Vector2):
+        partition.integrate(delta, rows)
 
 
-    def draw(self, surf: Surface, view_pos: Vector2):
+    def get_blit(self, surf: Surface, view_pos: Vector2) -> tuple:
         offset = Vector2(0, 0)
         if self.shake_cooldown > 0:
-            offset = Vector2(random.randint(-1, 1), random.randint(-1, 1))
-        super().draw(surf, view_pos, offset)
+            offset = Vector2(cosmetic_rng.randint(-1, 1), cosmetic_rng.randint(-1, 1))
+        return super().get_blit(surf, view_pos, offset)
     
 
 class CoinAsteroid(Asteroid):
     def __init__(self, position: Vector2, radius: float, velocity: Vector2, angular_velocity: float):
-        coin_asteroid_sprite = resource_manager.get_image('coin_asteroid')
-        super().__init__(position, radius, velocity, angular_velocity, coin_asteroid_sprite)
+        super().__init__(position, radius, velocity, angular_velocity, 'coin_asteroid')
     
 
     def destroy(self, player):
         global added_level_objects
         super().destroy(player)
-        amount_coins = math.floor(2 * math.sqrt(self.radius) + random.randint(-1, 1))
+        amount_coins = math.floor(2 * math.sqrt(self.radius) + rng.randint(-1, 1))
         for _ in range(amount_coins):
-            coin_position: Vector2 = self.position + Vector2.from_polar((random.uniform(0, self.radius), random.uniform(0, 360)))
+            coin_position: Vector2 = self.position + Vector2.from_polar((rng.uniform(0, self.radius), rng.uniform(0, 360)))
             coin_velocity = (coin_position - self.position).normalize() * 15
-            coin = Coin(coin_position, coin_velocity)
+            coin = coin_pool.acquire(coin_position, coin_velocity)
             added_level_objects.append(coin)
         player.score += 50
 
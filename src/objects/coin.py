@@ -1,6 +1,10 @@
+import numpy as np
 from pygame import Vector2
 import util
 from globals import resource_manager
+from object_pool import ObjectPool
+from entity_store import EntityPartition, EntityScalar
+from steering import get_lengths, get_steering
 
 
 RADIUS = 0.75
@@ -10,29 +14,52 @@ MAGNETIZE_ACCEL_BEGIN_SPEED = 200.0
 
 
 class Coin(util.AnimatedLevelObject):
+    ENTITY_KIND = 'coin'
+    # Coins are pulled towards the player from far away, so they are always simulated
+    SIMULATION_LOD = False
+
+    magnetize_delay = EntityScalar('magnetize_delays')
+
     def __init__(self, position: Vector2, velocity: Vector2):
-        coin_sprites = resource_manager.get_full_spritesheet('coin')
+        coin_sprites = resource_manager.get_scaled_spritesheet('coin', util.get_sprite_size(RADIUS))
         super().__init__(position, RADIUS, velocity, 0.0, coin_sprites, ANIMATION_FRAME_DURATION)
         self.magnetize_delay = 0.5
+        self.pool: ObjectPool | None = None
+
+
+    def reset(self, position: Vector2, velocity: Vector2):
+        self.position = position
+        self.previous_position = position
+        self.velocity = velocity
+        self.angle = 0.0
+        self.previous_angle = 0.0
+        self.queue_delete = False
+        self.animation_manager.reset()
+        self.sprite = self.animation_manager.get_current_frame()
+        self.magnetize_delay = 0.5
     
 
-    def update(self, delta: float, player_position: Vector2):
-        self.magnetize_delay = util.move_toward(self.magnetize_delay, 0, delta)
-        if self.magnetize_delay > 0:
-            self.position += self.velocity * delta
-            self.velocity *= 0.95
-        else:
-            direction = player_position - self.position
-            distance = direction.length()
-            
-            # Invert the speed calculation - slower when far, faster when close
-            desired_speed = MAGNETIZE_MAX_SPEED * (1 - (max(0, min(distance, MAGNETIZE_ACCEL_BEGIN_SPEED)) / MAGNETIZE_ACCEL_BEGIN_SPEED)) ** 2
-            
-            ideal_velocity = direction.normalize() * desired_speed
-            
-            # Increase steering strength when closer to make turns sharper
-            steering_strength = 3.0 * (1 - (max(0, min(distance, MAGNETIZE_ACCEL_BEGIN_SPEED)) / MAGNETIZE_ACCEL_BEGIN_SPEED))
-            steering = (ideal_velocity - self.velocity) * delta * steering_strength
-            
-            self.velocity += steering
-            super().update(delta)
\ No newline at end of file
+    # Coins drift and slow down until their magnetize delay is over, then steer to arrive at the player
+    @staticmethod
+    def update_batch(partition: EntityPartition, rows: np.ndarray, delta: float, player_position: Vector2):
+        magnetize_delays = np.maximum(partition.magnetize_delays[rows] - delta, 0)
+        partition.magnetize_delays[rows] = magnetize_delays
+
+        waiting = magnetize_delays > 0
+        drifting = rows[waiting]
+        partition.positions[drifting] += partition.velocities[drifting] * delta
+        partition.velocities[drifting] *= 0.95
+
+        magnetized = rows[~waiting]
+        direction = (player_position.x, player_position.y) - partition.positions[magnetized]
+        partition.velocities[magnetized] += get_steering(direction, get_lengths(direction), partition.velocities[magnetized], delta,
+                                                         MAGNETIZE_MAX_SPEED, MAGNETIZE_ACCEL_BEGIN_SPEED)
+        partition.positions[magnetized] += partition.velocities[magnetized] * delta
+        # Coins don't rotate, and they only animate once they are magnetized
+        for i in magnetized.tolist():
+            coin = partition.objects[i]
+            coin.animation_manager.update(delta)
+            coin.sprite = coin.animation_manager.get_current_frame()
+
+
+coin_pool: ObjectPool[Coin] = ObjectPool(Coin)
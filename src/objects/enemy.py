@@ -1,10 +1,13 @@
-import random
+from rng import rng, cosmetic_rng
 import math
+import numpy as np
 from pygame import Vector2, Surface
 import util
-from globals import resource_manager, particle_effects, added_level_objects
+from globals import resource_manager, voice_manager, particle_system, added_level_objects
 from particle.particle import ParticleEffect
-from objects.coin import Coin
+from objects.coin import coin_pool
+from entity_store import EntityPartition, EntityScalar
+from steering import get_lengths, normalize, move_towards_zero, get_steering, atan2
 
 
 ORBITER_RADIUS = 1.0
@@ -19,7 +22,8 @@ LONG_ORBITER_VIEW_DISTANCE = 60.0
 
 
 class Enemy(util.LevelObject):
-    def __init__(self, position: Vector2, radius: float, velocity: Vector2, sprite: Surface, health: int, coins: int, score: int):
+    def __init__(self, position: Vector2, radius: float, velocity: Vector2, sprite_id: str, health: int, coins: int, score: int):
+        sprite = resource_manager.get_scaled(sprite_id, util.get_sprite_size(radius))
         super().__init__(position, radius, velocity, 0, sprite)
         self.health = health
         self.coins = coins
@@ -28,15 +32,15 @@ class Enemy(util.LevelObject):
     
 
     def destroy(self, player):
-        global resource_manager, particle_effects
+        global resource_manager, particle_system
         self.queue_delete = True
         effect = ParticleEffect.primitive(20, self.position, 0, 360, 0, 200, 7, 1, 1, 0.2, 5, 2, (255, 50, 50), (255, 215, 0))
-        particle_effects.append(effect)
-        resource_manager.get_sound('explosion').play()
+        particle_system.emit(effect)
+        voice_manager.play('explosion')
 
         for _ in range(self.coins):
-            coin_position = self.position + Vector2(random.uniform(-self.radius, self.radius), random.uniform(-self.radius, self.radius)) / 2
-            coin = Coin(coin_position, Vector2(random.uniform(-10, 10), random.uniform(-10, 10)))
+            coin_position = self.position + Vector2(rng.uniform(-self.radius, self.radius), rng.uniform(-self.radius, self.radius)) / 2
+            coin = coin_pool.acquire(coin_position, Vector2(rng.uniform(-10, 10), rng.uniform(-10, 10)))
             added_level_objects.append(coin)
         player.score += self.score
     
@@ -46,59 +50,71 @@ class Enemy(util.LevelObject):
         if self.health <= 0:
             self.destroy(player)
         else:
-            resource_manager.get_sound('hit').play()
+            voice_manager.play('hit')
             self.shake_cooldown = 0.1
     
-    def update(self, delta: float):
-        super().update(delta)
-        self.shake_cooldown = util.move_toward(self.shake_cooldown, 0, delta)
 
-
-    def draw(self, surf: Surface, view_pos: Vector2):
+    def get_blit(self, surf: Surface, view_pos: Vector2) -> tuple:
         offset = Vector2(0, 0)
         if self.shake_cooldown > 0:
-            offset = Vector2(random.randint(-1, 1), random.randint(-1, 1))
-        super().draw(surf, view_pos, offset)
+            offset = Vector2(cosmetic_rng.randint(-1, 1), cosmetic_rng.randint(-1, 1))
+        return super().get_blit(surf, view_pos, offset)
 
 
 class Orbiter(Enemy):
-    def __init__(self, position: util.Vector2, sprite: Surface=None, view_distance: float=ORBITER_VIEW_DISTANCE):
-        if sprite is None:
-            sprite = resource_manager.get_image('orbiter')
-        super().__init__(position, ORBITER_RADIUS, Vector2(0, 0), sprite, 1, 1, 100)
+    ENTITY_KIND = 'orbiter'
+
+    view_distance = EntityScalar('view_distances')
+
+    def __init__(self, position: util.Vector2, sprite_id: str='orbiter', view_distance: float=ORBITER_VIEW_DISTANCE):
+        super().__init__(position, ORBITER_RADIUS, Vector2(0, 0), sprite_id, 1, 1, 100)
         self.view_distance = view_distance
     
 
-    def update(self, delta: float, player_position: Vector2):
-        if self.position.distance_to(player_position) < self.view_distance:
-            self.velocity += (player_position - self.position).normalize() * ORBITER_ACCEL * delta
-            angle = math.atan2(self.position.y - player_position.y, self.position.x - player_position.x) * 180 / math.pi
-            self.angle = angle
-        else:
-            self.velocity.move_towards_ip((0, 0), 0.1)
-        super().update(delta)
+    # Orbiters accelerate towards the player within their view distance and slow to a stop outside it
+    @staticmethod
+    def update_batch(partition: EntityPartition, rows: np.ndarray, delta: float, player_position: Vector2):
+        positions = partition.positions[rows]
+        direction = (player_position.x, player_position.y) - positions
+        distances = get_lengths(direction)
+
+        in_view = distances < partition.view_distances[rows]
+        near = rows[in_view]
+        partition.velocities[near] += normalize(direction[in_view], distances[in_view]) * ORBITER_ACCEL * delta
+        partition.angles[near] = atan2(positions[in_view, 1] - player_position.y, positions[in_view, 0] - player_position.x) * 180 / math.pi
+        far = rows[~in_view]
+        partition.velocities[far] = move_towards_zero(partition.velocities[far], 0.1)
+
+        partition.integrate(delta, rows)
+
+
+    # Orbiters slow down every tick rather than drift, so they stay awake until they come to rest
+    @staticmethod
+    def get_awake_mask(partition: EntityPartition) -> np.ndarray | None:
+        velocities = partition.velocities[:partition.count]
+        return (velocities[:, 0] != 0) | (velocities[:, 1] != 0)
 
 
 class SmartOrbiter(Enemy):
+    ENTITY_KIND = 'smart_orbiter'
+
     def __init__(self, position: Vector2):
-        sprite = resource_manager.get_image('smart_orbiter')
-        super().__init__(position, ORBITER_RADIUS, Vector2(0, 0), sprite, 1, 2, 150)
+        super().__init__(position, ORBITER_RADIUS, Vector2(0, 0), 'smart_orbiter', 1, 2, 150)
     
 
-    def update(self, delta: float, player_position: Vector2):
-        super().update(delta)
-        if self.position.distance_to(player_position) > SMART_ORBITER_VIEW_DISTANCE:
-            return
-        direction = player_position - self.position
-        distance = direction.length()
-        desired_speed = SMART_ORBITER_MAX_SPEED * (1 - (max(0, min(distance, SMART_ORBITER_ACCEL_BEGIN_SPEED)) / SMART_ORBITER_ACCEL_BEGIN_SPEED)) ** 2
-        ideal_velocity = direction.normalize() * desired_speed
-        steering_strength = 3.0 * (1 - (max(0, min(distance, SMART_ORBITER_ACCEL_BEGIN_SPEED)) / SMART_ORBITER_ACCEL_BEGIN_SPEED))
-        steering = (ideal_velocity - self.velocity) * delta * steering_strength
+    # Smart orbiters steer to arrive at the player within their view distance
+    @staticmethod
+    def update_batch(partition: EntityPartition, rows: np.ndarray, delta: float, player_position: Vector2):
+        partition.integrate(delta, rows)
+        positions = partition.positions[rows]
+        direction = (player_position.x, player_position.y) - positions
+        distances = get_lengths(direction)
 
-        angle = math.atan2(self.position.y - player_position.y, self.position.x - player_position.x) * -180 / math.pi + 180
-        self.angle = angle
-        self.velocity += steering
+        in_view = distances <= SMART_ORBITER_VIEW_DISTANCE
+        near = rows[in_view]
+        partition.velocities[near] += get_steering(direction[in_view], distances[in_view], partition.velocities[near], delta,
+                                                   SMART_ORBITER_MAX_SPEED, SMART_ORBITER_ACCEL_BEGIN_SPEED)
+        partition.angles[near] = atan2(positions[in_view, 1] - player_position.y, positions[in_view, 0] - player_position.x) * -180 / math.pi + 180
 
 
 
@@ -106,5 +122,4 @@ class SmartOrbiter(Enemy):
 
 class LongRangeOrbiter(Orbiter):
     def __init__(self, position: Vector2):
-        sprite = resource_manager.get_image('long_orbiter')
-        super().__init__(position, sprite, LONG_ORBITER_VIEW_DISTANCE)
\ No newline at end of file
+        super().__init__(position, 'long_orbiter', LONG_ORBITER_VIEW_DISTANCE)
\ No newline at end of file
@@ -7,6 +7,8 @@ RADIUS = 3.0
 FRAME_DURATION = 0.25
 
 class LevelEnd(util.AnimatedLevelObject):
+    ENTITY_KIND = 'level_end'
+
     def __init__(self, position: Vector2):
-        level_end_sheet = resource_manager.get_full_spritesheet('level_end_ss')
+        level_end_sheet = resource_manager.get_scaled_spritesheet('level_end_ss', util.get_sprite_size(RADIUS))
         super().__init__(position, RADIUS, Vector2(0, 0), 0.0, level_end_sheet, FRAME_DURATION)
\ No newline at end of file
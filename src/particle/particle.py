@@ -1,84 +1,209 @@
-import random
+from rng import rng
+import numpy as np
 import pygame
 from pygame import Vector2, Surface
 import util
+from object_pool import ObjectPool, release_to_pool
 
 
-def uniform_with_variance(value, variance):
-    return value + random.uniform(-variance, variance)
-
+INITIAL_CAPACITY = 256
+PRIMITIVE_COLOR_STEPS = 16
 
-class Particle:
-    def __init__(self, position: Vector2, velocity: Vector2, particle_angular_velocity: float, lifetime: float, sprite: Surface):
-        self.position = position.copy()
-        self.velocity = velocity.copy()
 
-        self.particle_angular_velocity = particle_angular_velocity
-        self.angle = 0.0
-
-        self.lifetime = lifetime
+def uniform_with_variance(value, variance):
+    return value + rng.uniform(-variance, variance)
 
-        self.sprite = sprite
-    
 
-    def tickdraw(self, delta: float, surf: Surface, view_pos: Vector2) -> bool:
-        self.position += self.velocity * delta
-        self.angle += util.wrap(self.particle_angular_velocity * delta, 0, 360)
-        
-        rotated_sprite = pygame.transform.rotate(self.sprite, self.angle)
-        sprite_half_size = Vector2(rotated_sprite.get_size()) / 2
-        screen_coordinate = util.world_to_screen(surf, view_pos, self.position, util.RENDER_SCALE)
-        surf.blit(rotated_sprite, screen_coordinate - sprite_half_size)
+primitive_sprites: dict[tuple[int, tuple[int, int, int]], Surface] = {}
 
-        self.lifetime -= delta
-        return self.lifetime <= 0
+def get_primitive_sprite(size: int, color: tuple[int, int, int]) -> Surface:
+    key = (size, color)
+    sprite = primitive_sprites.get(key)
+    if sprite is None:
+        sprite = Surface((size, size), pygame.SRCALPHA)
+        sprite.fill(color)
+        primitive_sprites[key] = sprite
+    return sprite
 
 
 class ParticleEffect:
-    def __init__(self, particle_count: int, position: Vector2, angle: float, angle_var: float, 
+    def __init__(self, particle_count: int, position: Vector2, angle: float, angle_var: float,
                  angular_velocity: float, angular_velocity_var: float,
                  emission_strength: float, emission_strength_var: float, duration: float, duration_var: float,
                  sprite: Surface | list[Surface], initialize: bool=True):
-        self.particles: list[Particle] = []
+        self.position = Vector2()
+        self.velocities: list[Vector2] = []
+        self.angular_velocities: list[float] = []
+        self.lifetimes: list[float] = []
+        self.sprites: list[Surface] = []
+        self.pool: ObjectPool | None = None
+        self.reset(particle_count, position, angle, angle_var, angular_velocity, angular_velocity_var,
+                   emission_strength, emission_strength_var, duration, duration_var, sprite, initialize)
+
+
+    def reset(self, particle_count: int, position: Vector2, angle: float, angle_var: float,
+              angular_velocity: float, angular_velocity_var: float,
+              emission_strength: float, emission_strength_var: float, duration: float, duration_var: float,
+              sprite: Surface | list[Surface], initialize: bool=True):
+        self.position.update(position)
         self.emission_vector: Vector2 = Vector2.from_polar((emission_strength, angle))
+        self.velocities.clear()
+        self.angular_velocities.clear()
+        self.lifetimes.clear()
+        self.sprites.clear()
 
         def get_sprite():
             if isinstance(sprite, list):
-                return random.choice(sprite)
+                return rng.choice(sprite)
             return sprite
 
         if initialize:
             for _ in range(particle_count):
-                particle_velocity = self.emission_vector.rotate(random.uniform(-angle_var, angle_var)) * uniform_with_variance(1, emission_strength_var)
+                particle_velocity = self.emission_vector.rotate(rng.uniform(-angle_var, angle_var)) * uniform_with_variance(1, emission_strength_var)
                 particle_angular_velocity = uniform_with_variance(angular_velocity, angular_velocity_var)
                 particle_duration = uniform_with_variance(duration, duration_var)
-                p = Particle(position, particle_velocity, particle_angular_velocity, particle_duration, get_sprite())
-                self.particles.append(p)
+                self.add_particle(particle_velocity, particle_angular_velocity, particle_duration, get_sprite())
 
 
+    # Effects are only emission batches, so they are pooled and released once emitted
     @staticmethod
-    def primitive(particle_count: int, position: Vector2, angle: float, angle_var: float, 
+    def create(particle_count: int, position: Vector2, angle: float, angle_var: float,
+               angular_velocity: float, angular_velocity_var: float,
+               emission_strength: float, emission_strength_var: float, duration: float, duration_var: float,
+               sprite: Surface | list[Surface], initialize: bool=True) -> "ParticleEffect":
+        return effect_pool.acquire(particle_count, position, angle, angle_var, angular_velocity, angular_velocity_var,
+                                   emission_strength, emission_strength_var, duration, duration_var, sprite, initialize)
+
+
+    @staticmethod
+    def primitive(particle_count: int, position: Vector2, angle: float, angle_var: float,
                  angular_velocity: float, angular_velocity_var: float,
                  emission_strength: float, emission_strength_var: float, duration: float, duration_var: float,
                  size: int, size_var, color1: tuple[int, int, int], color2: tuple[int, int, int]) -> "ParticleEffect":
-        effect = ParticleEffect(particle_count, position, angle, angle_var, 
-                       angular_velocity, angular_velocity_var, 
+        effect = ParticleEffect.create(particle_count, position, angle, angle_var,
+                       angular_velocity, angular_velocity_var,
                        emission_strength, emission_strength_var, duration, duration_var, None, initialize=False)
         for _ in range(particle_count):
-            particle_velocity = effect.emission_vector.rotate(random.uniform(-angle_var, angle_var)) * uniform_with_variance(1, emission_strength_var)
+            particle_velocity = effect.emission_vector.rotate(rng.uniform(-angle_var, angle_var)) * uniform_with_variance(1, emission_strength_var)
             particle_angular_velocity = uniform_with_variance(angular_velocity, angular_velocity_var)
             particle_duration = uniform_with_variance(duration, duration_var)
-            particle_size = uniform_with_variance(size, size_var)
-            particle_color = util.interpolate_color(color1, color2, random.uniform(0, 1))
-            sprite = Surface((particle_size, particle_size), pygame.SRCALPHA)
-            sprite.fill(particle_color)
-            p = Particle(position, particle_velocity, particle_angular_velocity, particle_duration, sprite)
-            effect.particles.append(p)
+            particle_size = int(uniform_with_variance(size, size_var))
+            # Colors are quantized so primitive sprites can be shared between particles
+            color_t = round(rng.uniform(0, 1) * PRIMITIVE_COLOR_STEPS) / PRIMITIVE_COLOR_STEPS
+            particle_color = util.interpolate_color(color1, color2, color_t)
+            sprite = get_primitive_sprite(particle_size, particle_color)
+            effect.add_particle(particle_velocity, particle_angular_velocity, particle_duration, sprite)
         return effect
-        
-
 
 
-    
-    def tickdraw(self, delta: float, surf: Surface, view_pos: Vector2):
-        self.particles = [p for p in self.particles if not p.tickdraw(delta, surf, view_pos)]
\ No newline at end of file
+    def add_particle(self, velocity: Vector2, angular_velocity: float, lifetime: float, sprite: Surface):
+        self.velocities.append(velocity)
+        self.angular_velocities.append(angular_velocity)
+        self.lifetimes.append(lifetime)
+        self.sprites.append(sprite)
+
+
+effect_pool: ObjectPool[ParticleEffect] = ObjectPool(ParticleEffect)
+
+
+class ParticleSystem:
+    def __init__(self, capacity: int=INITIAL_CAPACITY):
+        self.count = 0
+        self.positions = np.zeros((capacity, 2))
+        self.velocities = np.zeros((capacity, 2))
+        self.angles = np.zeros(capacity)
+        self.angular_velocities = np.zeros(capacity)
+        self.lifetimes = np.zeros(capacity)
+        self.sprite_indices = np.zeros(capacity, dtype=np.int32)
+
+        self.sprites: list[Surface] = []
+        self.sprite_ids: dict[Surface, int] = {}
+        self.last_delta = 0.0
+
+
+    def get_sprite_index(self, sprite: Surface) -> int:
+        index = self.sprite_ids.get(sprite)
+        if index is None:
+            index = len(self.sprites)
+            self.sprites.append(sprite)
+            self.sprite_ids[sprite] = index
+        return index
+
+
+    def reserve(self, capacity: int):
+        if capacity <= len(self.lifetimes):
+            return
+        new_capacity = max(capacity, len(self.lifetimes) * 2)
+        for name in ('positions', 'velocities', 'angles', 'angular_velocities', 'lifetimes', 'sprite_indices'):
+            old = getattr(self, name)
+            new = np.zeros((new_capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self.count] = old[:self.count]
+            setattr(self, name, new)
+
+
+    def emit(self, effect: ParticleEffect):
+        amount = len(effect.lifetimes)
+        if amount == 0:
+            release_to_pool(effect)
+            return
+        self.reserve(self.count + amount)
+        new = slice(self.count, self.count + amount)
+        self.positions[new] = (effect.position.x, effect.position.y)
+        self.velocities[new] = [(v.x, v.y) for v in effect.velocities]
+        self.angles[new] = 0.0
+        self.angular_velocities[new] = effect.angular_velocities
+        self.lifetimes[new] = effect.lifetimes
+        self.sprite_indices[new] = [self.get_sprite_index(s) for s in effect.sprites]
+        self.count += amount
+        release_to_pool(effect)
+
+
+    def clear(self):
+        self.count = 0
+
+
+    def update(self, delta: float):
+        self.last_delta = delta
+        if self.count == 0:
+            return
+        live = slice(0, self.count)
+        self.positions[live] += self.velocities[live] * delta
+        angles = self.angles[live]
+        angles += self.angular_velocities[live] * delta
+        np.mod(angles, 360, out=angles)
+
+        lifetimes = self.lifetimes[live]
+        lifetimes -= delta
+        alive = lifetimes > 0
+        alive_count = int(np.count_nonzero(alive))
+        if alive_count < self.count:
+            for array in (self.positions, self.velocities, self.angles, self.angular_velocities, self.lifetimes, self.sprite_indices):
+                array[:alive_count] = array[live][alive]
+            self.count = alive_count
+
+
+    def draw(self, surf: Surface, view_pos: Vector2, alpha: float=1.0):
+        if self.count == 0:
+            return
+        live = slice(0, self.count)
+        positions = self.positions[live]
+        angles = self.angles[live]
+        if alpha < 1.0:
+            # Step back along the velocity to where the particle was at this point of the last tick
+            positions = positions - self.velocities[live] * (1.0 - alpha) * self.last_delta
+
+        surf_width, surf_height = surf.get_size()
+        screen_coords = (positions - (view_pos.x, view_pos.y)) * util.RENDER_SCALE + (surf_width / 2.0, surf_height / 2.0)
+        on_screen = np.flatnonzero(
+            (screen_coords[:, 0] > -util.RENDER_SCALE) & (screen_coords[:, 0] < surf_width + util.RENDER_SCALE) &
+            (screen_coords[:, 1] > -util.RENDER_SCALE) & (screen_coords[:, 1] < surf_height + util.RENDER_SCALE)
+        )
+
+        blit_sequence = []
+        sprites = self.sprites
+        get_rotated = util.rotation_cache.get_rotated
+        for sprite_index, angle, (x, y) in zip(self.sprite_indices[on_screen].tolist(), angles[on_screen].tolist(),
+                                               screen_coords[on_screen].tolist()):
+            page, area = get_rotated(sprites[sprite_index], angle)
+            blit_sequence.append((page, (x - area.width / 2, y - area.height / 2), area))
+        surf.blits(blit_sequence, doreturn=False)
@@ -0,0 +1,99 @@
+import math
+import numpy as np
+from pygame import Vector2
+
+
+SEARCH_NEIGHBORS = 1
+
+
+class PathQuery:
+    def __init__(self, points: list[Vector2]):
+        if len(points) < 2:
+            raise ValueError("Need at least 2 points to form a line segment")
+
+        # Per segment: start, direction and squared length, then the center and radius of a circle around it.
+        # Levels only have a handful of segments, so plain floats are faster than arrays here.
+        self.segments: list[tuple[float, ...]] = []
+        for start, end in zip(points[:-1], points[1:]):
+            dx = end.x - start.x
+            dy = end.y - start.y
+            self.segments.append((start.x, start.y, dx, dy, dx*dx + dy*dy,
+                                  start.x + dx/2, start.y + dy/2, math.sqrt(dx*dx + dy*dy) / 2))
+        # The same columns as an array, for batch queries
+        self.segment_array = np.array(self.segments)
+
+        self.current_segment = 0
+
+
+    def get_segment_count(self) -> int:
+        return len(self.segments)
+
+
+    # Closest point on one segment, in the same order of operations as the equivalent Vector2 math
+    def project(self, x: float, y: float, segment_index: int) -> tuple[float, float, float]:
+        start_x, start_y, dx, dy, length_squared = self.segments[segment_index][:5]
+        if length_squared == 0:
+            closest_x, closest_y = start_x, start_y
+        else:
+            t = ((x - start_x)*dx + (y - start_y)*dy) / length_squared
+            t = max(0, min(1, t))
+            closest_x = start_x + dx*t
+            closest_y = start_y + dy*t
+        offset_x = x - closest_x
+        offset_y = y - closest_y
+        return math.sqrt(offset_x*offset_x + offset_y*offset_y), closest_x, closest_y
+
+
+    def closest_point(self, point: Vector2) -> tuple[float, Vector2]:
+        x, y = point.x, point.y
+        segment_count = self.get_segment_count()
+
+        # Search the segment we were closest to last time and its neighbours first. The player
+        # moves along the path, so this is almost always where the answer is.
+        first = max(0, self.current_segment - SEARCH_NEIGHBORS)
+        last = min(segment_count, self.current_segment + SEARCH_NEIGHBORS + 1)
+        best_distance = math.inf
+        for i in range(first, last):
+            distance, closest_x, closest_y = self.project(x, y, i)
+            if distance < best_distance:
+                best_distance, best_segment, best_x, best_y = distance, i, closest_x, closest_y
+
+        # Any other segment can only be closer if its bounding circle is nearer than the local result
+        for i in range(segment_count):
+            if first <= i < last:
+                continue
+            center_x, center_y, radius = self.segments[i][5:]
+            offset_x = x - center_x
+            offset_y = y - center_y
+            reach = best_distance + radius
+            if offset_x*offset_x + offset_y*offset_y >= reach*reach:
+                continue
+            distance, closest_x, closest_y = self.project(x, y, i)
+            if distance < best_distance:
+                best_distance, best_segment, best_x, best_y = distance, i, closest_x, closest_y
+
+        self.current_segment = best_segment
+        return best_distance, Vector2(best_x, best_y)
+
+
+    # Batch query for an (m, 2) array of points against every segment, returning (m,) distances and (m, 2) closest
+    # points. Uses the same arithmetic as project(), and leaves the segment closest_point() searches from alone.
+    def closest_points(self, points: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        start_x, start_y, dx, dy, length_squared = (self.segment_array[:, i] for i in range(5))
+        x = points[:, 0:1]
+        y = points[:, 1:2]
+
+        safe_length_squared = np.where(length_squared == 0, 1, length_squared)
+        t = ((x - start_x)*dx + (y - start_y)*dy) / safe_length_squared
+        t = np.where(length_squared == 0, 0, np.clip(t, 0, 1))
+        closest_x = start_x + dx*t
+        closest_y = start_y + dy*t
+        offset_x = x - closest_x
+        offset_y = y - closest_y
+        distances = np.sqrt(offset_x*offset_x + offset_y*offset_y)
+
+        best = np.argmin(distances, axis=1)
+        rows = np.arange(len(points))
+        closest = np.stack((closest_x[rows, best], closest_y[rows, best]), axis=1)
+        return distances[rows, best], closest
@@ -9,9 +9,11 @@ from objects.coin import Coin
 from objects.enemy import Enemy
 from objects.level_end import LevelEnd
 import globals
-from globals import resource_manager, particle_effects
+from globals import resource_manager, voice_manager, particle_system
 import state
 from particle.particle import ParticleEffect
+from spatial_hash import SpatialHash
+from object_pool import ObjectPool
 
 
 MAX_SPEED = 30.0
@@ -49,15 +51,38 @@ def ray_intersect_circle(ray_origin: Vector2, ray_angle: float, circle_center: V
     return proj_length >= 0 and within_radius
 
 
+bullet_sprite: Surface | None = None
+
+
+# Blitting this gives the same pixels as pygame.draw.circle with the bullet radius
+def get_bullet_sprite() -> Surface:
+    global bullet_sprite
+    if bullet_sprite is None:
+        sprite_radius = round(BULLET_RADIUS * util.RENDER_SCALE)
+        bullet_sprite = Surface((sprite_radius * 2, sprite_radius * 2), pygame.SRCALPHA).convert_alpha()
+        bullet_sprite.fill((0, 0, 0, 0))
+        pygame.draw.circle(bullet_sprite, (255, 255, 255), (sprite_radius, sprite_radius), sprite_radius)
+    return bullet_sprite
+
+
 class PlayerBullet(DynamicCollisionCircle):
     def __init__(self, position: Vector2, velocity: Vector2, parent: "Player"):
         super().__init__(position, BULLET_RADIUS, velocity)
         self.lifetime = BULLET_LIFETIME
         self.parent: Player = parent
+        self.pool: ObjectPool | None = None
+
+    def reset(self, position: Vector2, velocity: Vector2, parent: "Player"):
+        self.position.update(position)
+        self.previous_position.update(position)
+        self.velocity.update(velocity)
+        self.lifetime = BULLET_LIFETIME
+        self.parent = parent
     
-    def update(self, delta: float, level_objects: list[util.LevelObject]) -> bool:
+    def update(self, delta: float, spatial_hash: SpatialHash) -> bool:
+        self.store_previous_state()
         super().update(delta)
-        for obj in level_objects:
+        for obj in spatial_hash.query_circle(self):
             if not self.hits(obj):
                 continue
             if isinstance(obj, (Asteroid, Enemy)):
@@ -67,11 +92,21 @@ class PlayerBullet(DynamicCollisionCircle):
         self.lifetime -= delta
         return self.lifetime <= 0
     
-    def draw(self, surf: Surface, view_pos: Vector2):
+    def get_blit(self, surf: Surface, view_pos: Vector2) -> tuple:
+        sprite_radius = round(BULLET_RADIUS * util.RENDER_SCALE)
+        # draw.circle truncates the center towards zero, off the top or left edge too
         screen_coord = self.get_screen_coord(surf, view_pos)
-        pygame.draw.circle(surf, (255, 255, 255), screen_coord, self.radius * util.RENDER_SCALE)
+        blit_position = (int(screen_coord.x) - sprite_radius, int(screen_coord.y) - sprite_radius)
+        page, area = util.rotation_cache.get_rotated(get_bullet_sprite(), 0)
+        return page, blit_position, area
+    
+    def draw(self, surf: Surface, view_pos: Vector2):
+        surf.blit(*self.get_blit(surf, view_pos))
+
 
 
+bullet_pool: ObjectPool[PlayerBullet] = ObjectPool(PlayerBullet)
+
 
 class Player(DynamicCollisionCircle):
     def __init__(self):
@@ -133,7 +168,7 @@ class Player(DynamicCollisionCircle):
 
             effect_position = -forward * 1.25 + self.position
             effect = ParticleEffect.primitive(5, effect_position, self.angle+180, 20, 0, 150, 7, 1, 0.3, 0.1, 5, 2, (255, 50, 50), (255, 215, 0))
-            particle_effects.append(effect)
+            particle_system.emit(effect)
          
         # braking
         if brake:
@@ -144,18 +179,18 @@ class Player(DynamicCollisionCircle):
         # shoot
         if shoot and self.shoot_cooldown == 0:
             bullet_velocity = self.get_forward_vector() * BULLET_SPEED + self.velocity
-            bullet = PlayerBullet(self.position, bullet_velocity, self)
+            bullet = bullet_pool.acquire(self.position, bullet_velocity, self)
             self.bullets.append(bullet)
             fire_rate_level = self.upgrades['fire_rate']
             self.shoot_cooldown = -0.05*fire_rate_level + 0.4
-            resource_manager.get_sound('shoot').play()
+            voice_manager.play('shoot')
         
         # hook
         if hook:
             if self.selected_object is not None and self.hooked_object is None:
                 self.hooked_object = self.selected_object
                 self.hook_distance = self.position.distance_to(self.hooked_object.position)
-                resource_manager.get_sound('hook').play()
+                voice_manager.play('hook')
         else:
             self.hooked_object = None
     
@@ -181,49 +216,82 @@ class Player(DynamicCollisionCircle):
             self.velocity = projected_velocity - tension + normal
     
 
-    def update(self, delta: float, level_objects: list[util.LevelObject]):
+    # The nearest asteroid on the aim ray within HOOK_MAX_DISTANCE, found by walking the grid cells along the ray.
+    # An asteroid the ray enters at distance d has its center at least d - max_radius away, so once that
+    # bound passes the best candidate (or the hook range) nothing further along can be selected.
+    def find_hook_target(self, spatial_hash: SpatialHash) -> util.LevelObject | None:
+        ray_angle = 360 - self.angle
+        ray_direction = Vector2.from_polar((1, ray_angle))
+        best_object: util.LevelObject | None = None
+        best_distance = HOOK_MAX_DISTANCE
+        tested: set[int] = set()
+        for entry_distance, objects in spatial_hash.walk_ray(self.position, ray_direction, HOOK_MAX_DISTANCE + spatial_hash.max_radius):
+            if entry_distance - spatial_hash.max_radius > best_distance:
+                break
+            for obj in objects:
+                if id(obj) in tested or not isinstance(obj, Asteroid):
+                    continue
+                tested.add(id(obj))
+                if not ray_intersect_circle(self.position, ray_angle, obj.position, obj.radius):
+                    continue
+                distance = self.position.distance_to(obj.position)
+                if distance > HOOK_MAX_DISTANCE:
+                    continue
+                if best_object is None or self.position.distance_squared_to(obj.position) < self.position.distance_squared_to(best_object.position):
+                    best_object = obj
+                    best_distance = distance
+        return best_object
+
+
+    def update(self, delta: float, spatial_hash: SpatialHash):
         super().update(delta)
 
-        raycast_hit_objects: list[util.LevelObject] = []
-        for obj in level_objects:
-            if isinstance(obj, Asteroid) and ray_intersect_circle(self.position, 360-self.angle, obj.position, obj.radius):
-                raycast_hit_objects.append(obj)
-            
+        for obj in spatial_hash.query_circle(self):
             if not self.hits(obj):
                 continue
             if isinstance(obj, Coin):
-                resource_manager.get_sound('coin').play()
+                voice_manager.play('coin')
                 obj.queue_delete = True
                 self.coins += 1
             elif isinstance(obj, LevelEnd):
-                resource_manager.get_sound('end_level').play()
+                voice_manager.play('end_level')
                 state.switch_to_upgrade(self)
             else:
-                self.bullets.clear()
+                self.clear_bullets()
                 state.switch_to_game_over(self)
 
         
-        if raycast_hit_objects:
-            self.selected_object = min(raycast_hit_objects, key=lambda o: self.position.distance_squared_to(o.position))
-            if self.position.distance_to(self.selected_object.position) > HOOK_MAX_DISTANCE:
-                self.selected_object = None
-        else:
-            self.selected_object = None
+        self.selected_object = self.find_hook_target(spatial_hash)
 
         self.hook_update(delta)
         
-        self.bullets = [b for b in self.bullets if not b.update(delta, level_objects)]
+        # Compact the surviving bullets in place and hand the rest back to the pool
+        alive_count = 0
+        for bullet in self.bullets:
+            if bullet.update(delta, spatial_hash):
+                bullet_pool.release(bullet)
+            else:
+                self.bullets[alive_count] = bullet
+                alive_count += 1
+        del self.bullets[alive_count:]
         self.shoot_cooldown = util.move_toward(self.shoot_cooldown, 0, delta)
     
 
     def reset_objects(self):
-        self.bullets.clear()
+        self.clear_bullets()
         self.selected_object = None
         self.hooked_object = None
 
 
+    def clear_bullets(self):
+        for bullet in self.bullets:
+            bullet_pool.release(bullet)
+        self.bullets.clear()
+
+
     def reset_position(self):
         self.position = Vector2(0, 0)
+        self.previous_position = Vector2(0, 0)
         self.velocity = Vector2(0, 0)
         self.angle = 0.0
     
@@ -233,18 +301,18 @@ class Player(DynamicCollisionCircle):
 
     
     def draw(self, surf: Surface):
+        view_pos = self.get_render_position()
         surf_center = Vector2(surf.get_size()) / 2
         player_sprite = resource_manager.get_image('player')
-        player_sprite_rotated = pygame.transform.rotate(player_sprite, self.angle)
-        half_sprite_size = Vector2(player_sprite_rotated.get_size()) / 2
-        surf.blit(player_sprite_rotated, surf_center-half_sprite_size)
+        page, area = util.rotation_cache.get_rotated(player_sprite, self.angle)
+        half_sprite_size = Vector2(area.size) / 2
+        surf.blit(page, surf_center-half_sprite_size, area)
         if self.selected_object is not None:
-            selected_screen_coord = util.world_to_screen(surf, self.position, self.selected_object.position, util.RENDER_SCALE)
+            selected_screen_coord = util.world_to_screen(surf, view_pos, self.selected_object.get_render_position(), util.RENDER_SCALE)
             pygame.draw.circle(surf, (80, 80, 80), selected_screen_coord, 5)
             pygame.draw.circle(surf, (80, 80, 80), selected_screen_coord, 8, 1)
         if self.hooked_object is not None:
-            hooked_screen_coord = util.world_to_screen(surf, self.position, self.hooked_object.position, util.RENDER_SCALE)
+            hooked_screen_coord = util.world_to_screen(surf, view_pos, self.hooked_object.get_render_position(), util.RENDER_SCALE)
             pygame.draw.line(surf, (128, 128, 128), surf_center, hooked_screen_coord)
 
-        for bullet in self.bullets:
-            bullet.draw(surf, self.position)
\ No newline at end of file
+        surf.blits([bullet.get_blit(surf, view_pos) for bullet in self.bullets], doreturn=False)
\ No newline at end of file
@@ -0,0 +1,147 @@
+import csv
+import time
+import numpy as np
+import pygame
+from pygame import Surface
+
+
+PHASES = [
+    'events',
+    'input',
+    'broadphase',
+    'player',
+    'objects',
+    'delete_merge',
+    'path_query',
+    'particles',
+    'starfield',
+    'path_draw',
+    'object_draw',
+    'hud',
+    'ui',
+    'overlay',
+    'flip',
+    'idle',
+]
+PERCENTILES = (50, 95, 99)
+HISTORY_FRAMES = 300
+OVERLAY_REFRESH_FRAMES = 15
+OVERLAY_LINE_HEIGHT = 18
+OVERLAY_NAME_WIDTH = 150
+OVERLAY_COLUMN_WIDTH = 70
+
+
+# Times named phases of each frame. A mark attributes the time since the previous mark to a phase,
+# so marks go at the end of each phase. Nothing is recorded unless the overlay is shown or a CSV is open.
+class FrameProfiler:
+    def __init__(self, history_frames: int=HISTORY_FRAMES):
+        self.phase_indices = {phase: i for i, phase in enumerate(PHASES)}
+        # One row per frame: every phase followed by the frame total, in seconds
+        self.history = np.zeros((history_frames, len(PHASES) + 1))
+        self.history_count = 0
+        self.history_index = 0
+        self.current = [0.0] * len(PHASES)
+
+        self.frame_number = 0
+        self.frame_start: float | None = None
+        self.last_mark: float | None = None
+
+        self.overlay_visible = False
+        self.overlay_surface: Surface | None = None
+        self.frames_since_overlay = 0
+
+        self.csv_file = None
+        self.csv_writer = None
+
+
+    def is_enabled(self) -> bool:
+        return self.overlay_visible or self.csv_writer is not None
+
+
+    def toggle_overlay(self):
+        self.overlay_visible = not self.overlay_visible
+        self.overlay_surface = None
+
+
+    def open_csv(self, path: str):
+        self.close_csv()
+        self.csv_file = open(path, 'w', newline='')
+        self.csv_writer = csv.writer(self.csv_file)
+        self.csv_writer.writerow(['frame', 'total_ms'] + [f'{phase}_ms' for phase in PHASES])
+
+
+    def close_csv(self):
+        if self.csv_file is not None:
+            self.csv_file.close()
+        self.csv_file = None
+        self.csv_writer = None
+
+
+    def begin_frame(self):
+        if not self.is_enabled():
+            return
+        self.frame_start = self.last_mark = time.perf_counter()
+        self.current = [0.0] * len(PHASES)
+
+
+    def mark(self, phase: str):
+        if self.last_mark is None:
+            return
+        now = time.perf_counter()
+        self.current[self.phase_indices[phase]] += now - self.last_mark
+        self.last_mark = now
+
+
+    def end_frame(self):
+        if self.last_mark is None:
+            return
+        total = self.last_mark - self.frame_start
+        self.history[self.history_index, :-1] = self.current
+        self.history[self.history_index, -1] = total
+        self.history_index = (self.history_index + 1) % len(self.history)
+        self.history_count = min(self.history_count + 1, len(self.history))
+
+        if self.csv_writer is not None:
+            self.csv_writer.writerow([self.frame_number, f'{total * 1000:.4f}'] + [f'{t * 1000:.4f}' for t in self.current])
+        self.frame_number += 1
+        self.frame_start = self.last_mark = None
+        self.frames_since_overlay += 1
+
+
+    # Returns an array of shape (len(PERCENTILES), len(PHASES) + 1) in milliseconds, the last column being the frame total
+    def get_percentiles(self) -> np.ndarray:
+        if self.history_count == 0:
+            return np.zeros((len(PERCENTILES), len(PHASES) + 1))
+        return np.percentile(self.history[:self.history_count], PERCENTILES, axis=0) * 1000
+
+
+    # The overlay font is proportional, so every cell is rendered on its own at a fixed column position
+    def compose_overlay(self, font: pygame.font.Font):
+        percentiles = self.get_percentiles()
+        rows = [['phase'] + [f'p{p}' for p in PERCENTILES]]
+        for i, phase in enumerate(PHASES + ['total']):
+            rows.append([phase] + [f'{percentiles[j, i]:.2f}' for j in range(len(PERCENTILES))])
+
+        width = OVERLAY_NAME_WIDTH + len(PERCENTILES) * OVERLAY_COLUMN_WIDTH + 10
+        self.overlay_surface = Surface((width, len(rows) * OVERLAY_LINE_HEIGHT + 10), pygame.SRCALPHA)
+        self.overlay_surface.fill((0, 0, 0, 160))
+        for i, row in enumerate(rows):
+            y = 5 + i * OVERLAY_LINE_HEIGHT
+            self.overlay_surface.blit(font.render(row[0], True, (255, 255, 255)), (5, y))
+            for j, cell in enumerate(row[1:]):
+                label = font.render(cell, True, (255, 255, 255))
+                # Numbers are right aligned to the end of their column
+                column_end = 5 + OVERLAY_NAME_WIDTH + (j + 1) * OVERLAY_COLUMN_WIDTH
+                self.overlay_surface.blit(label, (column_end - label.get_width(), y))
+        self.frames_since_overlay = 0
+
+
+    def draw_overlay(self, surf: Surface, font: pygame.font.Font):
+        if not self.overlay_visible:
+            return
+        if self.overlay_surface is None or self.frames_since_overlay >= OVERLAY_REFRESH_FRAMES:
+            self.compose_overlay(font)
+        surf.blit(self.overlay_surface, (surf.get_width() - self.overlay_surface.get_width() - 5, 5))
+
+
+profiler = FrameProfiler()
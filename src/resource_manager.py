@@ -1,21 +1,157 @@
-import random
+from rng import rng
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+import io
+import os
+import time
+import warnings
 import pygame
 from pygame import mixer, Surface
+from asset_bundle import AssetBundle
 
+
+ASSET_LOADER_WORKERS = 4
+ROTATION_BUCKET_SIZE = 2.0
+ROTATION_CACHE_MAX_BYTES = 64 * 1024 * 1024
+TEXT_CACHE_MAX_ENTRIES = 256
+ATLAS_PAGE_SIZE = 1024
+
+
+def get_surface_bytes(surf: Surface) -> int:
+    width, height = surf.get_size()
+    return width * height * surf.get_bytesize()
+
+
+# Where the time for loading one asset went. Read and decode times are spent on a loader thread, finish time
+# on the main thread (waiting for the loader, surface conversion and spritesheet slicing). Lazy sounds are
+# decoded on the main thread when first played.
+class LoadMetric:
+    def __init__(self, asset_id: str, kind: str, path: str):
+        self.asset_id = asset_id
+        self.kind = kind
+        self.path = path
+        self.file_bytes = 0
+        self.read_time = 0.0
+        self.decode_time = 0.0
+        self.finish_time = 0.0
+
+    def get_total_time(self) -> float:
+        return self.read_time + self.decode_time + self.finish_time
+
+    def __repr__(self) -> str:
+        return (f'{self.kind:>11} {self.asset_id:<20} {self.file_bytes:>8}B  read {self.read_time * 1000:6.2f}ms  '
+                f'decode {self.decode_time * 1000:6.2f}ms  finish {self.finish_time * 1000:6.2f}ms')
+
+
+def read_image(image_path: str, metric: LoadMetric) -> Surface:
+    start = time.perf_counter()
+    with open(image_path, 'rb') as f:
+        data = f.read()
+    decode_start = time.perf_counter()
+    image = pygame.image.load(io.BytesIO(data), os.path.basename(image_path))
+    metric.file_bytes = len(data)
+    metric.read_time = decode_start - start
+    metric.decode_time = time.perf_counter() - decode_start
+    return image
+
+
+def read_sound(sound_path: str, metric: LoadMetric) -> mixer.Sound:
+    start = time.perf_counter()
+    sound = mixer.Sound(sound_path)
+    metric.file_bytes = os.path.getsize(sound_path)
+    metric.decode_time = time.perf_counter() - start
+    return sound
+
+
+# Assets are read and decoded on a thread pool as soon as they are queued with a load_* call.
+# Anything that needs the display or the main thread happens when the asset is first used, or in finish_loading().
 class ResourceManager:
     def __init__(self):
         self.images: dict[str, Surface] = {}
         self.spritesheets: dict[str, list[Surface]] = {}
         self.sounds: dict[str, mixer.Sound] = {}
+        self.scaled_images: dict[tuple[str, int], Surface] = {}
+        self.scaled_spritesheets: dict[tuple[str, int], list[Surface]] = {}
+
+        self.loader: ThreadPoolExecutor | None = None
+        self.pending_images: dict[str, Future] = {}
+        self.pending_spritesheets: dict[str, tuple[Future, tuple[int, int]]] = {}
+        self.pending_sounds: dict[str, Future] = {}
+        self.lazy_sounds: dict[str, str] = {}
+        self.load_metrics: dict[str, LoadMetric] = {}
+        self.bundle: AssetBundle | None = None
+
+    def get_loader(self) -> ThreadPoolExecutor:
+        if self.loader is None:
+            self.loader = ThreadPoolExecutor(max_workers=ASSET_LOADER_WORKERS, thread_name_prefix='asset_loader')
+        return self.loader
+
+    def add_metric(self, asset_id: str, kind: str, path: str) -> LoadMetric:
+        metric = LoadMetric(asset_id, kind, path)
+        self.load_metrics[f'{kind}:{asset_id}'] = metric
+        return metric
     
+    # Images and spritesheets found in a loaded bundle are built from it instead of their files,
+    # unless their file changed since the bundle was compiled
+    def load_bundle(self, bundle_path: str) -> bool:
+        if not os.path.exists(bundle_path):
+            return False
+        try:
+            self.bundle = AssetBundle(bundle_path)
+        except ValueError as e:
+            warnings.warn(f'{e}, loading the images instead. Rebuild it with asset_bundle.py.')
+            return False
+        return True
+
+    def is_bundled(self, kind: str, asset_id: str, path: str, sprite_size: list[int] | None=None) -> bool:
+        if self.bundle is None or asset_id not in self.bundle.sources[kind]:
+            return False
+        if not self.bundle.is_current(kind, asset_id, path, sprite_size):
+            warnings.warn(f'{path} changed since {self.bundle.path} was compiled, loading it instead. Rebuild the bundle with asset_bundle.py.')
+            return False
+        return True
+
     def load_image(self, image_id: str, image_path: str):
-        img = pygame.image.load(image_path).convert_alpha()
-        self.images[image_id] = img
+        if self.is_bundled('image', image_id, image_path):
+            metric = self.add_metric(image_id, 'image', self.bundle.path)
+            start = time.perf_counter()
+            self.images[image_id] = self.bundle.get_image(image_id)
+            metric.file_bytes = self.bundle.get_frame_bytes(self.bundle.images[image_id])
+            metric.finish_time = time.perf_counter() - start
+            return
+        metric = self.add_metric(image_id, 'image', image_path)
+        self.pending_images[image_id] = self.get_loader().submit(read_image, image_path, metric)
     
     def load_spritesheet(self, spritesheet_id: str, spritesheet_path: str, sprite_size: tuple[int, int]):
-        sheet_images: list[Surface] = []
-        sheet = pygame.image.load(spritesheet_path).convert_alpha()
+        if self.is_bundled('spritesheet', spritesheet_id, spritesheet_path, sprite_size):
+            metric = self.add_metric(spritesheet_id, 'spritesheet', self.bundle.path)
+            start = time.perf_counter()
+            self.spritesheets[spritesheet_id] = self.bundle.get_spritesheet(spritesheet_id)
+            metric.file_bytes = sum(self.bundle.get_frame_bytes(entry) for entry in self.bundle.spritesheets[spritesheet_id])
+            metric.finish_time = time.perf_counter() - start
+            return
+        metric = self.add_metric(spritesheet_id, 'spritesheet', spritesheet_path)
+        self.pending_spritesheets[spritesheet_id] = (self.get_loader().submit(read_image, spritesheet_path, metric), sprite_size)
+    
+    # Lazy sounds are only decoded the first time they are played
+    def load_sound(self, sound_id: str, sound_path: str, lazy: bool=False):
+        if lazy:
+            self.lazy_sounds[sound_id] = sound_path
+            return
+        metric = self.add_metric(sound_id, 'sound', sound_path)
+        self.pending_sounds[sound_id] = self.get_loader().submit(read_sound, sound_path, metric)
+
+    def finish_image(self, image_id: str):
+        start = time.perf_counter()
+        self.images[image_id] = self.pending_images.pop(image_id).result().convert_alpha()
+        self.load_metrics[f'image:{image_id}'].finish_time += time.perf_counter() - start
 
+    def finish_spritesheet(self, spritesheet_id: str):
+        start = time.perf_counter()
+        future, sprite_size = self.pending_spritesheets.pop(spritesheet_id)
+        sheet = future.result().convert_alpha()
+
+        sheet_images: list[Surface] = []
         spritesheet_height = sheet.get_size()[1]
         sprite_width, sprite_height = sprite_size
         amount_sprites = spritesheet_height // sprite_height
@@ -23,27 +159,70 @@ class ResourceManager:
             sprite = Surface((sprite_width, sprite_height), pygame.SRCALPHA)
             sprite.blit(sheet, (0, 0), (0, i*sprite_height, sprite_width, sprite_height))
             sheet_images.append(sprite)
-        
+
         self.spritesheets[spritesheet_id] = sheet_images
-    
-    def load_sound(self, sound_id: str, sound_path: str):
-        sound = mixer.Sound(sound_path)
-        self.sounds[sound_id] = sound
+        self.load_metrics[f'spritesheet:{spritesheet_id}'].finish_time += time.perf_counter() - start
+
+    def finish_sound(self, sound_id: str):
+        if sound_id in self.lazy_sounds:
+            metric = self.add_metric(sound_id, 'lazy sound', self.lazy_sounds.pop(sound_id))
+            self.sounds[sound_id] = read_sound(metric.path, metric)
+            return
+        start = time.perf_counter()
+        self.sounds[sound_id] = self.pending_sounds.pop(sound_id).result()
+        self.load_metrics[f'sound:{sound_id}'].finish_time += time.perf_counter() - start
+
+    # Waits for every queued image and sound. Spritesheets are sliced on first use and lazy sounds stay encoded.
+    def finish_loading(self):
+        for image_id in list(self.pending_images):
+            self.finish_image(image_id)
+        for sound_id in list(self.pending_sounds):
+            self.finish_sound(sound_id)
+        # Queued spritesheets still finish decoding, then the threads exit
+        if self.loader is not None:
+            self.loader.shutdown(wait=False)
+            self.loader = None
+
+    def get_load_metrics(self) -> list[LoadMetric]:
+        return sorted(self.load_metrics.values(), key=lambda metric: metric.get_total_time(), reverse=True)
     
 
     def get_image(self, image_id: str) -> Surface:
+        if image_id in self.pending_images:
+            self.finish_image(image_id)
         return self.images[image_id]
 
+    # Scaled copies are shared between every object that asks for the same image and size
+    def get_scaled(self, image_id: str, size: int) -> Surface:
+        key = (image_id, size)
+        scaled = self.scaled_images.get(key)
+        if scaled is None:
+            scaled = pygame.transform.scale(self.get_image(image_id), (size, size))
+            self.scaled_images[key] = scaled
+        return scaled
+
+    def get_scaled_spritesheet(self, spritesheet_id: str, size: int) -> list[Surface]:
+        key = (spritesheet_id, size)
+        scaled = self.scaled_spritesheets.get(key)
+        if scaled is None:
+            scaled = [pygame.transform.scale(sprite, (size, size)) for sprite in self.get_full_spritesheet(spritesheet_id)]
+            self.scaled_spritesheets[key] = scaled
+        return scaled
+
     def get_full_spritesheet(self, spritesheet_id: str) -> list[Surface]:
+        if spritesheet_id in self.pending_spritesheets:
+            self.finish_spritesheet(spritesheet_id)
         return self.spritesheets[spritesheet_id]
 
     def get_spritesheet_image(self, spritesheet_id: str, index: int) -> Surface:
-        return self.spritesheets[spritesheet_id][index]
+        return self.get_full_spritesheet(spritesheet_id)[index]
     
     def get_random_spritesheet_image(self, name: str) -> Surface:
-        return random.choice(self.spritesheets[name])
+        return rng.choice(self.get_full_spritesheet(name))
 
     def get_sound(self, sound_id: str) -> mixer.Sound:
+        if sound_id in self.pending_sounds or sound_id in self.lazy_sounds:
+            self.finish_sound(sound_id)
         return self.sounds[sound_id]
 
 
@@ -61,4 +240,163 @@ class AnimationManager:
             self.frame_timer = 0.0
 
     def get_current_frame(self) -> Surface:
-        return self.sprites[self.frame_index]
\ No newline at end of file
+        return self.sprites[self.frame_index]
+
+    def reset(self):
+        self.frame_index = 0
+        self.frame_timer = 0.0
+
+
+# Rotated sprites are drawn as areas of atlas pages, see SpriteAtlas. Bucket 0 is a copy of the sprite itself,
+# so every sprite drawn through the cache comes from a page.
+class RotationCache:
+    def __init__(self, bucket_size: float=ROTATION_BUCKET_SIZE, max_bytes: int=ROTATION_CACHE_MAX_BYTES):
+        self.atlas = SpriteAtlas(max_bytes=max_bytes)
+        self.set_bucket_size(bucket_size)
+
+    def set_bucket_size(self, bucket_size: float):
+        self.bucket_size = bucket_size
+        self.bucket_count = max(1, round(360 / bucket_size))
+        self.clear()
+
+    # The page and area holding the sprite rotated to the nearest bucket
+    def get_rotated(self, sprite: Surface, angle: float) -> tuple[Surface, pygame.Rect]:
+        bucket = round(angle / self.bucket_size) % self.bucket_count
+        key = (sprite, bucket)
+        region = self.atlas.get(key)
+        if region is not None:
+            return region
+        rotated = sprite if bucket == 0 else pygame.transform.rotate(sprite, bucket * self.bucket_size)
+        return self.atlas.add(key, rotated)
+
+    def end_frame(self):
+        self.atlas.end_frame()
+
+    def clear(self):
+        self.atlas.clear()
+
+
+# Packs sprites into a few large pages, so a layer can be drawn as areas of the same surfaces in one
+# blits() call. Sprites are placed left to right on shelves as tall as the tallest sprite in them, and a
+# sprite larger than a page gets a page of its own. Space is reclaimed a page at a time: once the pages
+# are over budget, the least recently drawn page is emptied for reuse. Pages drawn from this frame are
+# never emptied, since their areas may already be queued for a blits() call.
+class SpriteAtlas:
+    def __init__(self, page_size: int=ATLAS_PAGE_SIZE, max_bytes: int=ROTATION_CACHE_MAX_BYTES):
+        self.page_size = page_size
+        self.max_bytes = max_bytes
+        self.pages: list[Surface] = []
+        # Keys of the regions on each page and the last frame each page was drawn from
+        self.page_keys: list[list] = []
+        self.page_frames: list[int] = []
+        self.regions: dict[object, tuple[int, pygame.Rect]] = {}
+        self.used_bytes = 0
+        self.frame = 0
+        self.current_page: int | None = None
+        self.shelf_x = 0
+        self.shelf_y = 0
+        self.shelf_height = 0
+
+    def get(self, key) -> tuple[Surface, pygame.Rect] | None:
+        region = self.regions.get(key)
+        if region is None:
+            return None
+        page_index, area = region
+        self.page_frames[page_index] = self.frame
+        return self.pages[page_index], area
+
+    def add(self, key, sprite: Surface) -> tuple[Surface, pygame.Rect]:
+        width, height = sprite.get_size()
+        if width > self.page_size or height > self.page_size:
+            page_index = self.get_empty_page(width, height)
+            area = pygame.Rect(0, 0, width, height)
+        else:
+            if self.shelf_x + width > self.page_size:
+                self.shelf_x = 0
+                self.shelf_y += self.shelf_height
+                self.shelf_height = 0
+            if self.current_page is None or self.shelf_y + height > self.page_size:
+                self.current_page = self.get_empty_page(self.page_size, self.page_size)
+                self.shelf_x = 0
+                self.shelf_y = 0
+                self.shelf_height = 0
+            page_index = self.current_page
+            area = pygame.Rect(self.shelf_x, self.shelf_y, width, height)
+            self.shelf_x += width
+            self.shelf_height = max(self.shelf_height, height)
+
+        page = self.pages[page_index]
+        # Adding onto the transparent page copies the pixels exactly, a normal alpha blit would blend them
+        page.blit(sprite, area.topleft, special_flags=pygame.BLEND_RGBA_ADD)
+        self.regions[key] = (page_index, area)
+        self.page_keys[page_index].append(key)
+        self.page_frames[page_index] = self.frame
+        return page, area
+
+    # Index of a transparent page of the given size, reusing the least recently drawn page when over budget
+    def get_empty_page(self, width: int, height: int) -> int:
+        page_bytes = width * height * 4
+        page_index = None
+        if self.used_bytes + page_bytes > self.max_bytes:
+            idle_pages = [i for i, frame in enumerate(self.page_frames) if frame < self.frame]
+            if idle_pages:
+                page_index = min(idle_pages, key=lambda i: self.page_frames[i])
+                self.empty_page(page_index)
+
+        if page_index is None:
+            page_index = len(self.pages)
+            self.pages.append(None)
+            self.page_keys.append([])
+            self.page_frames.append(self.frame)
+        page = self.pages[page_index]
+        if page is None or page.get_size() != (width, height):
+            if page is not None:
+                self.used_bytes -= get_surface_bytes(page)
+            page = Surface((width, height), pygame.SRCALPHA).convert_alpha()
+            self.pages[page_index] = page
+            self.used_bytes += get_surface_bytes(page)
+        page.fill((0, 0, 0, 0))
+        return page_index
+
+    def empty_page(self, page_index: int):
+        for key in self.page_keys[page_index]:
+            del self.regions[key]
+        self.page_keys[page_index].clear()
+        if page_index == self.current_page:
+            self.current_page = None
+
+    def end_frame(self):
+        self.frame += 1
+
+    def clear(self):
+        self.pages.clear()
+        self.page_keys.clear()
+        self.page_frames.clear()
+        self.regions.clear()
+        self.used_bytes = 0
+        self.current_page = None
+        self.shelf_x = 0
+        self.shelf_y = 0
+        self.shelf_height = 0
+
+
+class TextCache:
+    def __init__(self, max_entries: int=TEXT_CACHE_MAX_ENTRIES):
+        self.surfaces: OrderedDict[tuple[pygame.font.Font, str, tuple], Surface] = OrderedDict()
+        self.max_entries = max_entries
+
+    def render(self, font: pygame.font.Font, text: str, color: tuple=(255, 255, 255)) -> Surface:
+        key = (font, text, color)
+        label = self.surfaces.get(key)
+        if label is not None:
+            self.surfaces.move_to_end(key)
+            return label
+
+        label = font.render(text, True, color)
+        self.surfaces[key] = label
+        if len(self.surfaces) > self.max_entries:
+            self.surfaces.popitem(last=False)
+        return label
+
+    def clear(self):
+        self.surfaces.clear()
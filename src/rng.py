@@ -0,0 +1,17 @@
+import random
+
+
+# Every gameplay system draws from this one generator so a run can be reproduced from its seed.
+rng = random.Random()
+# Purely visual randomness, like hit shake and the starfield, depends on what is drawn and on the window size.
+# It has its own generator so rendering never shifts the gameplay rolls.
+cosmetic_rng = random.Random()
+
+
+def seed(value: int | None):
+    rng.seed(value)
+    cosmetic_rng.seed(value)
+
+
+def set_rng(source: random.Random):
+    rng.setstate(source.getstate())
@@ -0,0 +1,100 @@
+import math
+from typing import Iterator
+import numpy as np
+from pygame import Vector2
+from util import CollisionCircle
+from entity_store import EntityStore
+
+
+DEFAULT_CELL_SIZE = 10.0
+
+
+class SpatialHash:
+    def __init__(self, cell_size: float=DEFAULT_CELL_SIZE):
+        self.cell_size = cell_size
+        self.cells: dict[tuple[int, int], list[int]] = {}
+        self.objects: list[CollisionCircle] = []
+        # Largest radius inserted since the last clear, bounds how far past a cell an object can reach
+        self.max_radius = 0.0
+
+
+    def get_cell(self, x: float, y: float) -> tuple[int, int]:
+        return math.floor(x / self.cell_size), math.floor(y / self.cell_size)
+
+
+    def clear(self):
+        self.cells.clear()
+        self.objects = []
+        self.max_radius = 0.0
+
+
+    # Inserts every object in the store. The cell ranges of each partition are computed from its arrays in one go.
+    def rebuild_from_store(self, store: EntityStore):
+        self.clear()
+        for partition in store.partitions.values():
+            if partition.count == 0:
+                continue
+            positions = partition.positions[:partition.count]
+            radii = partition.radii[:partition.count, None]
+            self.max_radius = max(self.max_radius, float(radii.max()))
+            min_cells = np.floor((positions - radii) / self.cell_size).astype(int).tolist()
+            max_cells = np.floor((positions + radii) / self.cell_size).astype(int).tolist()
+            for obj, (min_x, min_y), (max_x, max_y) in zip(partition.objects, min_cells, max_cells):
+                index = len(self.objects)
+                self.objects.append(obj)
+                for cell_x in range(min_x, max_x + 1):
+                    for cell_y in range(min_y, max_y + 1):
+                        cell = self.cells.get((cell_x, cell_y))
+                        if cell is None:
+                            self.cells[(cell_x, cell_y)] = [index]
+                        else:
+                            cell.append(index)
+
+
+    # Returns the objects sharing a cell with the circle's bounding box, in insertion order
+    def query(self, position: Vector2, radius: float) -> list[CollisionCircle]:
+        min_x, min_y = self.get_cell(position.x - radius, position.y - radius)
+        max_x, max_y = self.get_cell(position.x + radius, position.y + radius)
+        indices: set[int] = set()
+        for cell_x in range(min_x, max_x + 1):
+            for cell_y in range(min_y, max_y + 1):
+                cell = self.cells.get((cell_x, cell_y))
+                if cell is not None:
+                    indices.update(cell)
+        return [self.objects[i] for i in sorted(indices)]
+
+
+    def query_circle(self, circle: CollisionCircle) -> list[CollisionCircle]:
+        return self.query(circle.position, circle.radius)
+
+
+    # Walks the cells a ray passes through in order (Amanatides & Woo), yielding the distance along the ray
+    # at which each non-empty cell is entered and the objects in it. An object can appear in several cells.
+    def walk_ray(self, origin: Vector2, direction: Vector2, max_distance: float) -> Iterator[tuple[float, list[CollisionCircle]]]:
+        cell_x, cell_y = self.get_cell(origin.x, origin.y)
+        step_x = 1 if direction.x > 0 else -1
+        step_y = 1 if direction.y > 0 else -1
+        if direction.x != 0:
+            next_x = ((cell_x + (step_x > 0)) * self.cell_size - origin.x) / direction.x
+            delta_x = self.cell_size / abs(direction.x)
+        else:
+            next_x = delta_x = math.inf
+        if direction.y != 0:
+            next_y = ((cell_y + (step_y > 0)) * self.cell_size - origin.y) / direction.y
+            delta_y = self.cell_size / abs(direction.y)
+        else:
+            next_y = delta_y = math.inf
+
+        distance = 0.0
+        while distance <= max_distance:
+            cell = self.cells.get((cell_x, cell_y))
+            if cell is not None:
+                yield distance, [self.objects[i] for i in cell]
+            if next_x < next_y:
+                distance = next_x
+                next_x += delta_x
+                cell_x += step_x
+            else:
+                distance = next_y
+                next_y += delta_y
+                cell_y += step_y
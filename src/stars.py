@@ -1,73 +1,105 @@
 import pygame
-import random
+from rng import cosmetic_rng
 from pygame.math import Vector2
 import util
 
 
+WRAP_PADDING = 100
+STAR_COLOR_DIM = (64, 64, 64)
+STAR_COLOR_BRIGHT = (128, 128, 128)
+
+
+def get_wrapped_coords(value: float, radius: int, size: int) -> list[float]:
+    coords = [value]
+    if value - radius < 0:
+        coords.append(value + size)
+    if value + radius > size:
+        coords.append(value - size)
+    return coords
+
+
 class StarfieldBackground:
-    def __init__(self, initial_size, num_stars=1000, parallax_factor=0.5):
+    def __init__(self, initial_size, num_stars=1000, parallax_factor=0.5, num_layers=1):
         """
         Initialize the starfield background
-        
+
         Args:
             initial_size (tuple): Initial size of the surface (width, height)
-            num_stars (int): Number of stars to generate
-            parallax_factor (float): How much slower the stars move compared to the foreground
+            num_stars (int): Number of stars to generate, split evenly across the layers
+            parallax_factor (float): How much slower the nearest layer moves compared to the foreground
                                    (0 = static, 1 = moves with foreground)
+            num_layers (int): Number of parallax layers. Farther layers move proportionally slower.
         """
         self.width, self.height = initial_size
         self.num_stars = num_stars
         self.parallax_factor = parallax_factor
-        self.surface = pygame.Surface(initial_size)
-        
+        self.num_layers = num_layers
+
         # Generate random star positions
         # We generate them in a larger area than the screen to allow for movement
         self.stars = []
         padding = 1000  # Extra space around the visible area
-        for _ in range(num_stars):
-            x = random.uniform(-padding, self.width + padding)
-            y = random.uniform(-padding, self.height + padding)
-            radius = random.randint(1, 2)  # Random star size
-            self.stars.append((Vector2(x, y), radius))
-    
+        for i in range(num_stars):
+            x = cosmetic_rng.uniform(-padding, self.width + padding)
+            y = cosmetic_rng.uniform(-padding, self.height + padding)
+            radius = cosmetic_rng.randint(1, 2)  # Random star size
+            color = util.interpolate_color(STAR_COLOR_DIM, STAR_COLOR_BRIGHT, cosmetic_rng.uniform(0, 1))
+            layer = i % num_layers
+            self.stars.append((Vector2(x, y), radius, color, layer))
+
+        self.layer_factors = [parallax_factor * (i + 1) / num_layers for i in range(num_layers)]
+        self.layer_offsets = [(0, 0)] * num_layers
+        self.render_layers()
+
+    def render_layers(self):
+        """
+        Pre-render every layer into a tile that wraps around the padded screen area.
+        Stars overlapping a tile edge are drawn on the opposite edge as well so the seams are invisible.
+        """
+        tile_width = self.width + WRAP_PADDING * 2
+        tile_height = self.height + WRAP_PADDING * 2
+        self.layers: list[pygame.Surface] = []
+        for i in range(self.num_layers):
+            layer = pygame.Surface((tile_width, tile_height)).convert()
+            layer.fill((0, 0, 0))
+            # The back layer is opaque so drawing the starfield also clears the target
+            if i > 0:
+                layer.set_colorkey((0, 0, 0))
+            self.layers.append(layer)
+
+        for star_pos, radius, color, layer in self.stars:
+            x = star_pos.x % tile_width
+            y = star_pos.y % tile_height
+            for wrapped_x in get_wrapped_coords(x, radius, tile_width):
+                for wrapped_y in get_wrapped_coords(y, radius, tile_height):
+                    pygame.draw.circle(self.layers[layer], color, (wrapped_x, wrapped_y), radius)
+
     def resize(self, new_size):
-        """Resize the background surface"""
+        """Resize the background and re-render its layers"""
         self.width, self.height = new_size
-        self.surface = pygame.Surface(new_size)
-    
+        self.render_layers()
+
     def update(self, player_pos):
         """
         Update the starfield based on player position
-        
+
         Args:
             player_pos (Vector2): Current player position
         """
-        # Clear the surface
-        self.surface.fill((0, 0, 0))  # Black background
-        
-        # Calculate offset based on player position and parallax factor
-        offset = player_pos * self.parallax_factor
-        
-        # Draw each star
-        for star_pos, radius in self.stars:
-            # Calculate screen position
-            screen_pos = star_pos - offset
-            
-            # Wrap stars around the screen
-            wrapped_x = screen_pos.x % (self.width + 200) - 100
-            wrapped_y = screen_pos.y % (self.height + 200) - 100
-            
-            # Only draw if within screen bounds (with some padding)
-            color = util.interpolate_color((64, 64, 64), (128, 128, 128), random.uniform(0, 1))
-            if (-100 <= wrapped_x <= self.width + 100 and 
-                -100 <= wrapped_y <= self.height + 100):
-                pygame.draw.circle(
-                    self.surface,
-                    color,
-                    (wrapped_x, wrapped_y),
-                    radius
-                )
-    
+        tile_width = self.width + WRAP_PADDING * 2
+        tile_height = self.height + WRAP_PADDING * 2
+        for i, factor in enumerate(self.layer_factors):
+            # Calculate offset based on player position and parallax factor
+            offset = player_pos * factor
+            self.layer_offsets[i] = (-offset.x % tile_width - WRAP_PADDING, -offset.y % tile_height - WRAP_PADDING)
+
     def draw(self, target_surface):
         """Draw the starfield to the target surface"""
-        target_surface.blit(self.surface, (0, 0))
+        tile_width = self.width + WRAP_PADDING * 2
+        tile_height = self.height + WRAP_PADDING * 2
+        for layer, (offset_x, offset_y) in zip(self.layers, self.layer_offsets):
+            # The tile wraps, so at most four blits are needed to cover the screen
+            target_surface.blit(layer, (offset_x, offset_y))
+            target_surface.blit(layer, (offset_x - tile_width, offset_y))
+            target_surface.blit(layer, (offset_x, offset_y - tile_height))
+            target_surface.blit(layer, (offset_x - tile_width, offset_y - tile_height))
@@ -0,0 +1,101 @@
+import builtins
+import sys
+import threading
+import time
+
+
+STARTUP_REPORT_FLAG = '--startup-report'
+IMPORT_REPORT_COUNT = 15
+ASSET_REPORT_COUNT = 10
+
+
+# Times the cold start: each module import, then named phases up to the first frame. Imports are timed by
+# wrapping __import__, so it has to be enabled before the modules it should measure are imported.
+# Time is counted from when this module is imported, so interpreter start-up is not included.
+class StartupReport:
+    def __init__(self):
+        self.enabled = False
+        self.finished = False
+        self.start_time = time.perf_counter()
+        # Asset loader threads import while timing is on. Only the main thread's imports delay the first
+        # frame, and a shared stack would mix up their nesting, so imports on other threads aren't timed.
+        self.main_thread = threading.main_thread()
+        self.last_mark = self.start_time
+        self.phases: list[tuple[str, float]] = []
+        # Inclusive and self time of every module imported while enabled
+        self.import_times: dict[str, tuple[float, float]] = {}
+        self.import_stack: list[float] = []
+        self.original_import = None
+
+
+    def enable(self):
+        if self.enabled:
+            return
+        self.enabled = True
+        self.original_import = builtins.__import__
+        builtins.__import__ = self.timed_import
+
+
+    def timed_import(self, name: str, globals=None, locals=None, fromlist=(), level: int=0):
+        if level > 0 or name in sys.modules or threading.current_thread() is not self.main_thread:
+            return self.original_import(name, globals, locals, fromlist, level)
+
+        self.import_stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            return self.original_import(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.perf_counter() - start
+            nested = self.import_stack.pop()
+            self.import_times[name] = (elapsed, elapsed - nested)
+            if self.import_stack:
+                self.import_stack[-1] += elapsed
+
+
+    def stop_import_timing(self):
+        if self.original_import is not None:
+            builtins.__import__ = self.original_import
+            self.original_import = None
+
+
+    def is_pending(self) -> bool:
+        return self.enabled and not self.finished
+
+
+    # Attributes the time since the previous mark to a phase
+    def mark(self, phase: str):
+        if not self.is_pending():
+            return
+        now = time.perf_counter()
+        self.phases.append((phase, now - self.last_mark))
+        self.last_mark = now
+
+
+    def get_report(self, load_metrics: list) -> str:
+        total = self.last_mark - self.start_time
+        lines = [f'Startup: {total * 1000:.1f}ms to first frame, not counting interpreter start-up']
+        for phase, seconds in self.phases:
+            lines.append(f'  {phase:<16}{seconds * 1000:8.1f}ms')
+
+        lines.append('Slowest imports (inclusive, self):')
+        slowest_imports = sorted(self.import_times.items(), key=lambda item: item[1][0], reverse=True)
+        for name, (inclusive, own) in slowest_imports[:IMPORT_REPORT_COUNT]:
+            lines.append(f'  {name:<44}{inclusive * 1000:8.1f}ms {own * 1000:8.1f}ms')
+
+        lines.append('Slowest assets:')
+        for metric in load_metrics[:ASSET_REPORT_COUNT]:
+            lines.append(f'  {metric}')
+        return '\n'.join(lines)
+
+
+    # Ends the last phase at the first frame and prints the report
+    def finish(self, load_metrics: list):
+        if not self.is_pending():
+            return
+        self.mark('first_frame')
+        self.finished = True
+        self.stop_import_timing()
+        print(self.get_report(load_metrics))
+
+
+startup_report = StartupReport()
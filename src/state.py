@@ -1,10 +1,9 @@
 from globals import game_state, GameStateEnum, resource_manager
 from pygame import Vector2
 import globals
-from globals import resource_manager, ui_handler, particle_effects, added_level_objects
+from globals import resource_manager, voice_manager, ui_handler, particle_system, added_level_objects
 from ui.ui import UpgradeBox, LabelButton
 from level_gen import level_manager
-from tutorial import open_tutorial_window
 
 UPGRADE_BOX_SIZE = Vector2(500, 100)
 MAX_UPGRADE_LEVEL = 4
@@ -17,6 +16,8 @@ def initialize_main_menu(player):
     def start_callback():
         switch_to_level(player)
     def tutorial_callback():
+        # Tk is only loaded once the tutorial is opened
+        from tutorial import open_tutorial_window
         open_tutorial_window()
     def controls_callback():
         globals.keyboard_aim = not globals.keyboard_aim
@@ -24,6 +25,7 @@ def initialize_main_menu(player):
             controls_button.text = 'Aiming: Keyboard'
         else:
             controls_button.text = 'Aiming: Mouse'
+        controls_button.mark_dirty()
 
     start_button = LabelButton(Vector2(100, 100), Vector2(400, 80), start_callback, 'Start')
     tutorial_button = LabelButton(Vector2(100, 100), Vector2(400, 80), tutorial_callback, 'How to Play')
@@ -41,9 +43,10 @@ def purchase_logic(player, upgrade_id: str, upgrade_box: UpgradeBox):
         player.upgrades[upgrade_id] += 1
         upgrade_box.cost = calculate_upgrade_cost(player.upgrades[upgrade_id])
         upgrade_box.level += 1
-        resource_manager.get_sound('upgrade').play()
+        upgrade_box.mark_dirty()
+        voice_manager.play('upgrade')
     else:
-        resource_manager.get_sound('hit').play()
+        voice_manager.play('purchase_failed')
 
 
 def initialize_upgrade_menu(player):
@@ -81,7 +84,7 @@ def initialize_upgrade_menu(player):
 
 def switch_to_level(player):
     player.reset_position()
-    particle_effects.clear()
+    particle_system.clear()
     added_level_objects.clear()
     level_manager.load_next_level()
     game_state.set_state(GameStateEnum.LEVEL)
@@ -90,15 +93,17 @@ def switch_to_level(player):
 def switch_to_upgrade(player):
     global game_state
     initialize_upgrade_menu(player)
+    level_manager.prepare_next_level()
     game_state.set_state(GameStateEnum.UPGRADE)
 
 
 def switch_to_game_over(player):
-    resource_manager.get_sound('death').play()
+    voice_manager.play('death')
     player.reset_objects()
     game_state.set_state(GameStateEnum.GAME_OVER)
 
 
 def switch_to_menu(player):
     initialize_main_menu(player)
+    level_manager.prepare_next_level()
     game_state.set_state(GameStateEnum.MENU)
\ No newline at end of file
@@ -0,0 +1,43 @@
+import math
+import numpy as np
+
+
+# Vectorized forms of the per-object Vector2 math used by the AI updates. The operations are done
+# in the same order as pygame and Python do them, and the ones NumPy rounds differently are done per
+# element, so the batched updates give bitwise the same results.
+
+def get_lengths(vectors: np.ndarray) -> np.ndarray:
+    return np.sqrt(vectors[:, 0] * vectors[:, 0] + vectors[:, 1] * vectors[:, 1])
+
+
+# np.arctan2 can differ from math.atan2 in the last bit, so angles use math.atan2 to stay identical
+def atan2(y: np.ndarray, x: np.ndarray) -> np.ndarray:
+    return np.array([math.atan2(a, b) for a, b in zip(y.tolist(), x.tolist())], dtype=float)
+
+
+# Python's float ** 2 goes through the C library pow, which can differ from x * x in the last bit
+def square(values: np.ndarray) -> np.ndarray:
+    return np.array([value ** 2 for value in values.tolist()], dtype=float)
+
+
+# Vector2.normalize() for each row, except zero rows stay zero instead of raising
+def normalize(vectors: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    return vectors / np.where(lengths == 0, 1, lengths)[:, None]
+
+
+# Vector2.move_towards((0, 0), max_distance) for each row. pygame scales the offset by max_distance / length,
+# dividing first would round differently.
+def move_towards_zero(vectors: np.ndarray, max_distance: float) -> np.ndarray:
+    lengths = get_lengths(vectors)
+    moved = vectors + -vectors * (max_distance / np.where(lengths == 0, 1, lengths))[:, None]
+    return np.where((lengths <= max_distance)[:, None], 0.0, moved)
+
+
+# Arrival steering: the desired speed and steering strength grow as the target gets closer
+def get_steering(directions: np.ndarray, distances: np.ndarray, velocities: np.ndarray, delta: float,
+                 max_speed: float, accel_begin_speed: float) -> np.ndarray:
+    closeness = 1 - np.maximum(0, np.minimum(distances, accel_begin_speed)) / accel_begin_speed
+    desired_speeds = max_speed * square(closeness)
+    ideal_velocities = normalize(directions, distances) * desired_speeds[:, None]
+    steering_strengths = 3.0 * closeness
+    return (ideal_velocities - velocities) * delta * steering_strengths[:, None]
@@ -0,0 +1,30 @@
+DEFAULT_TICK_RATE = 60
+DEFAULT_MAX_STEPS = 5
+
+
+class FixedTimestep:
+    def __init__(self, tick_rate: float=DEFAULT_TICK_RATE, max_steps: int=DEFAULT_MAX_STEPS):
+        self.step = 1.0 / tick_rate
+        self.max_steps = max_steps
+        self.accumulator = 0.0
+
+
+    # Returns how many fixed steps to simulate for this frame
+    def advance(self, frame_delta: float) -> int:
+        self.accumulator += frame_delta
+        steps = int(self.accumulator // self.step)
+        if steps > self.max_steps:
+            # Drop the time we can't catch up on instead of spiralling further behind
+            steps = self.max_steps
+            self.accumulator = self.step * self.max_steps
+        self.accumulator -= steps * self.step
+        return steps
+
+
+    # How far the current frame is between the previous and current simulation state
+    def get_alpha(self) -> float:
+        return min(self.accumulator / self.step, 1.0)
+
+
+    def reset(self):
+        self.accumulator = 0.0
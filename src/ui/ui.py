@@ -15,6 +15,19 @@ class Button:
         self.callback = callback
 
         self.hovered = False
+
+        # The composed surface is reused until something it shows changes
+        self.dirty = True
+        self.cached_surface: Surface | None = None
+        self.cached_font: pygame.font.Font | None = None
+    
+    def mark_dirty(self):
+        self.dirty = True
+
+    def set_hovered(self, hovered: bool):
+        if hovered != self.hovered:
+            self.hovered = hovered
+            self.mark_dirty()
     
     def update_position_size(self, position: Vector2, size: Vector2):
         self.position = position
@@ -24,12 +37,19 @@ class Button:
         return (point.x > self.position.x and point.x < self.position.x+self.size.x and
                 point.y > self.position.y and point.y < self.position.y+self.size.y)
 
-    def get_surface(self) -> Surface:
+    def compose_surface(self, font: pygame.font.Font | None) -> Surface:
         surf = pygame.Surface(self.size, pygame.SRCALPHA)
         surf.fill((0, 0, 0, 64))
         if self.hovered:
             pygame.draw.rect(surf, (255, 255, 255, 255), (0, 0, self.size.x, self.size.y), 3)
         return surf
+
+    def get_surface(self, font: pygame.font.Font | None=None) -> Surface:
+        if self.dirty or font is not self.cached_font:
+            self.cached_surface = self.compose_surface(font)
+            self.cached_font = font
+            self.dirty = False
+        return self.cached_surface
     
     def draw(self, surf: Surface):
         surf.blit(self.get_surface(), self.position)
@@ -40,8 +60,8 @@ class LabelButton(Button):
         super().__init__(position, size, callback)
         self.text = text
     
-    def get_surface(self, font: pygame.font.Font) -> Surface:
-        surf = super().get_surface()
+    def compose_surface(self, font: pygame.font.Font) -> Surface:
+        surf = super().compose_surface(font)
         label = font.render(self.text, True, (255, 255, 255))
         label_pos = Vector2(surf.get_size()) / 2 - Vector2(label.get_size()) / 2
         surf.blit(label, label_pos)
@@ -56,8 +76,8 @@ class UpgradeBox(Button):
         self.cost = cost
         self.level = level
 
-    def get_surface(self, font: pygame.font.Font) -> Surface:
-        surf = super().get_surface()
+    def compose_surface(self, font: pygame.font.Font) -> Surface:
+        surf = super().compose_surface(font)
         surf.blit(self.icon, (5, 5))
 
         title_label = font.render(self.title, True, (255, 255, 255, 255))
@@ -85,9 +105,9 @@ class UiHandler:
         for element in self.elements:
             if element.hits_point(mouse_position):
                 self.selected_element = element
-                element.hovered = True
+                element.set_hovered(True)
             else:
-                element.hovered = False
+                element.set_hovered(False)
         if all(not e.hovered for e in self.elements):
             self.selected_element = None
         
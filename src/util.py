@@ -1,10 +1,26 @@
 import math
+import numpy as np
 import pygame
 from pygame import Vector2, Surface
-from resource_manager import AnimationManager
+from resource_manager import AnimationManager, RotationCache
+from entity_store import EntityPartition, EntityVector, EntityScalar, init_entity
 
 
 RENDER_SCALE = 10
+# Sprite sizes are snapped to this radius step so objects of similar size share scaled surfaces.
+# It divides every radius the level generator and the fixed-size objects use, so none of them change size.
+SPRITE_RADIUS_STEP = 0.25
+
+# Every rotated sprite is an area of an atlas page, so a layer can be drawn with one blits() call
+rotation_cache = RotationCache()
+
+# Fraction of a simulation step that has elapsed since the last tick, used to interpolate rendering
+interpolation_alpha = 1.0
+
+
+def set_interpolation_alpha(alpha: float):
+    global interpolation_alpha
+    interpolation_alpha = alpha
 
 
 def draw_circle_alpha(surf: Surface, color: tuple[int, int, int], alpha: int, center: Vector2, radius: int):
@@ -68,8 +84,12 @@ class CollisionCircle:
         )
 
 
+    def get_render_position(self) -> Vector2:
+        return self.position
+
+
     def get_screen_coord(self, surf: Surface, view_pos: Vector2):
-        return world_to_screen(surf, view_pos, self.position, RENDER_SCALE)
+        return world_to_screen(surf, view_pos, self.get_render_position(), RENDER_SCALE)
 
 
     # Debug draw function
@@ -82,12 +102,27 @@ class DynamicCollisionCircle(CollisionCircle):
     def __init__(self, position: Vector2, radius: float, velocity: Vector2):
         super().__init__(position, radius)
         self.velocity = Vector2(velocity)
+        self.previous_position = Vector2(self.position)
+
+
+    def store_previous_state(self):
+        self.previous_position.update(self.position)
+
+
+    def get_render_position(self) -> Vector2:
+        if interpolation_alpha >= 1.0:
+            return self.position
+        return self.previous_position.lerp(self.position, interpolation_alpha)
     
 
     def update(self, delta: float):
         self.position += self.velocity * delta
 
 
+def get_sprite_size(radius: float) -> int:
+    return round(round(radius / SPRITE_RADIUS_STEP) * SPRITE_RADIUS_STEP * 2 * RENDER_SCALE)
+
+
 def wrap(x: float, lower: float, upper: float) -> float:
     return lower + (x - lower) % (upper - lower)
 
@@ -96,6 +131,11 @@ def map_range(x: float, from_lower: float, from_upper: float, to_lower: float, t
     return to_lower + ((to_upper - to_lower) / (from_upper - from_lower)) * (x - from_lower)
 
 
+def lerp_angle(a: float, b: float, t: float) -> float:
+    difference = (b - a + 180) % 360 - 180
+    return a + difference * t
+
+
 def move_toward(current: float, target: float, delta: float) -> float:
     direction = (target - current) > 0
     adjustment = min(abs(target - current), delta)
@@ -120,83 +160,71 @@ def get_viewport_rect(surf: Surface, view_pos: Vector2) -> Rect:
     return viewport.move(view_pos - half_viewport_size)
 
 
-def closest_segment_point_distance(point: Vector2, points: list[Vector2]) -> tuple[float, Vector2]:
-    if len(points) < 2:
-        raise ValueError("Need at least 2 points to form a line segment")
-        
-    min_distance = float('inf')
-    closest_point = None
-    
-    # Check each line segment formed by consecutive points
-    for i in range(len(points) - 1):
-        distance, segment_point = point_to_segment_distance(point, points[i], points[i + 1])
-        if distance < min_distance:
-            min_distance = distance
-            closest_point = segment_point
-        
-    return min_distance, closest_point
-
-def point_to_segment_distance(point: Vector2, segment_start: Vector2, segment_end: Vector2) -> tuple[float, Vector2]:
-    # Vector from segment start to end
-    segment = segment_end - segment_start
-    
-    # If segment has zero length, return distance to either endpoint
-    if segment.length() == 0:
-        return (point - segment_start).length(), Vector2(segment_start)
-    
-    # Vector from segment start to point
-    point_vector = point - segment_start
-    
-    # Calculate normalized projection of point onto segment
-    t = point_vector.dot(segment) / segment.dot(segment)
-    
-    # Clamp t to [0,1] to handle points beyond segment endpoints
-    t = max(0, min(1, t))
-    
-    # Calculate the closest point on segment
-    closest = segment_start + segment * t
-    
-    # Return distance and closest point
-    return (point - closest).length(), closest
-
-
-
+# Sprites are expected to already be scaled to get_sprite_size(radius), see ResourceManager.get_scaled.
+# The physical state lives in the entity store, partitioned by ENTITY_KIND, so it can be updated in batches.
+# New objects are detached until they are added to the store along with the level's object list.
 class LevelObject(DynamicCollisionCircle):
+    ENTITY_KIND = 'object'
+    # Whether batch updated kinds may tick at a reduced rate far from the player, see EntityPartition.schedule
+    SIMULATION_LOD = True
+
+    position = EntityVector('positions')
+    radius = EntityScalar('radii')
+    previous_position = EntityVector('previous_positions')
+    velocity = EntityVector('velocities')
+    angle = EntityScalar('angles')
+    previous_angle = EntityScalar('previous_angles')
+    angular_velocity = EntityScalar('angular_velocities')
+    shake_cooldown = EntityScalar('shake_cooldowns')
+
     def __init__(self, position: Vector2, radius: float, velocity: Vector2, angular_velocity: float, sprite: Surface):
+        init_entity(self, self.ENTITY_KIND)
         super().__init__(position, radius, velocity)
         self.angular_velocity = angular_velocity
         self.angle = 0.0
+        self.previous_angle = 0.0
         self.sprite = sprite
-
-        scaled_sprite_size = radius * 2 * RENDER_SCALE
-        self.sprite = pygame.transform.scale(sprite, Vector2(scaled_sprite_size, scaled_sprite_size))
         self.queue_delete = False
 
 
+    # Rows that must be updated every tick even outside the activity zone, None if only distance matters
+    @staticmethod
+    def get_awake_mask(partition: EntityPartition) -> np.ndarray | None:
+        return None
+
+
+    def store_previous_state(self):
+        self.previous_position = self.position
+        self.previous_angle = self.angle
+
+
+    def get_render_angle(self) -> float:
+        if interpolation_alpha >= 1.0:
+            return self.angle
+        return lerp_angle(self.previous_angle, self.angle, interpolation_alpha)
+
+
     def update(self, delta: float):
         super().update(delta)
         self.angle += self.angular_velocity * delta
 
 
-    def draw(self, surf: Surface, view_pos: Vector2, screen_coord_offset: Vector2=Vector2(0, 0)):
+    # The (surface, dest, area) entry for drawing this object with Surface.blits, an area of a rotation cache page
+    def get_blit(self, surf: Surface, view_pos: Vector2, screen_coord_offset: Vector2=Vector2(0, 0)) -> tuple:
         screen_coord = self.get_screen_coord(surf, view_pos) + screen_coord_offset
-        blit_sprite = self.sprite
-        if self.angle != 0:
-            blit_sprite = pygame.transform.rotate(self.sprite, self.angle)
-        
-        blit_position = screen_coord - Vector2(blit_sprite.get_size()) / 2
-        surf.blit(blit_sprite, blit_position)
+        page, area = rotation_cache.get_rotated(self.sprite, self.get_render_angle())
+        blit_position = screen_coord - Vector2(area.size) / 2
+        return page, blit_position, area
+
+
+    def draw(self, surf: Surface, view_pos: Vector2):
+        surf.blit(*self.get_blit(surf, view_pos))
 
 
 class AnimatedLevelObject(LevelObject):
     def __init__(self, position: Vector2, radius: float, velocity: Vector2, angular_velocity: float, sprites: list[Surface], frame_duration: float):
         super().__init__(position, radius, velocity, angular_velocity, sprites[0])
-        scaled_sprite_size = radius * 2 * RENDER_SCALE
-        scaled_sprites = []
-        for sprite in sprites:
-            scaled_sprite = pygame.transform.scale(sprite, Vector2(scaled_sprite_size, scaled_sprite_size))
-            scaled_sprites.append(scaled_sprite)
-        self.animation_manager = AnimationManager(scaled_sprites, frame_duration)
+        self.animation_manager = AnimationManager(sprites, frame_duration)
     
 
     def update(self, delta: float):
@@ -218,6 +246,48 @@ def tile_surface(destination_surf: Surface, source_surf: Surface, tile_scale: fl
             destination_surf.blit(source_surf, blit_pos)
 
 
+# A full-screen tint, allocated once per window size and blended with surface alpha
+class ColorOverlay:
+    def __init__(self, color: tuple[int, int, int]):
+        self.color = color
+        self.surface: Surface | None = None
+
+    def draw(self, destination_surf: Surface, alpha: float):
+        if alpha <= 0:
+            return
+        if alpha >= 255:
+            # Fully opaque alpha blits are much slower than a plain fill
+            destination_surf.fill(self.color)
+            return
+        if self.surface is None or self.surface.get_size() != destination_surf.get_size():
+            self.surface = Surface(destination_surf.get_size()).convert()
+            self.surface.fill(self.color)
+        self.surface.set_alpha(round(alpha))
+        destination_surf.blit(self.surface, (0, 0))
+
+
+# Keeps fully tiled backgrounds so drawing one is a single blit. Cleared when the window is resized.
+class BackgroundCache:
+    def __init__(self):
+        self.backgrounds: dict[tuple[Surface, float, tuple[int, int]], Surface] = {}
+
+    def get(self, source_surf: Surface, tile_scale: float, size: tuple[int, int]) -> Surface:
+        key = (source_surf, tile_scale, size)
+        background = self.backgrounds.get(key)
+        if background is None:
+            background = Surface(size).convert()
+            background.fill((0, 0, 0))
+            tile_surface(background, source_surf, tile_scale)
+            self.backgrounds[key] = background
+        return background
+
+    def draw(self, destination_surf: Surface, source_surf: Surface, tile_scale: float=1.0):
+        destination_surf.blit(self.get(source_surf, tile_scale, destination_surf.get_size()), (0, 0))
+
+    def clear(self):
+        self.backgrounds.clear()
+
+
 def interpolate_color(color1: tuple[int, int, int], color2: tuple[int, int, int], t: float) -> tuple[int, int, int]:
     if not (0 <= t <= 1):
         raise ValueError("The value of t must be between 0 and 1.")